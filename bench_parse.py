@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+比較各 HTML parser backend 解析詳細頁面的速度 (pages/second)
+
+用法:
+    python bench_parse.py [sample_dir] [rounds]
+
+sample_dir 內的 *.html 作為樣本；未指定時使用 .http_cache 中快取的詳細頁面。
+"""
+import gzip
+import importlib.util
+import logging
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+from json_mange_detail import MangaDetailScraper, PARSER_BACKENDS
+
+def load_samples(sample_dir=None):
+    if sample_dir:
+        return [p.read_text(encoding='utf-8') for p in sorted(Path(sample_dir).glob('*.html'))]
+    return [gzip.decompress(p.read_bytes()).decode('utf-8')
+            for p in sorted(Path('.http_cache/bodies').glob('*/*.gz'))]
+
+def bench(backend, samples, rounds):
+    scraper = MangaDetailScraper(parser=backend)
+    results = [scraper.parse_html('', html) for html in samples]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for html in samples:
+            scraper.parse_html('', html)
+    elapsed = time.perf_counter() - start
+    return len(samples) * rounds / elapsed, results
+
+def main():
+    sample_dir = sys.argv[1] if len(sys.argv) > 1 else None
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    # 解析時的逐頁 log 會干擾計時
+    logging.getLogger('json_mange_detail').setLevel(logging.WARNING)
+    samples = load_samples(sample_dir)
+    if not samples:
+        print("No sample pages found")
+        return
+
+    print(f"Benchmarking {len(samples)} pages x {rounds} rounds")
+    baseline = None
+    for backend, (features, _) in PARSER_BACKENDS.items():
+        if features == 'lxml' and importlib.util.find_spec('lxml') is None:
+            print(f"{backend:22} skipped (lxml not installed)")
+            continue
+        pages_per_sec, results = bench(backend, samples, rounds)
+        details = [asdict(r) if r else None for r in results]
+        if baseline is None:
+            baseline = details
+        mismatches = sum(1 for a, b in zip(baseline, details) if a != b)
+        print(f"{backend:22} {pages_per_sec:8.1f} pages/s   mismatches vs html.parser: {mismatches}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+比較最大 genre 頁面的渲染時間：舊的字串累加寫法 vs html_render 的預編譯模板串流寫入
+
+用法:
+    python bench_render.py [catalog.jsonl] [rounds]
+
+未指定快照時以 5000 筆假資料測試。
+"""
+import html
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from html_render import render_genre_page
+
+def legacy_render(genre_names, manga_list, output_dir):
+    """html_genre.generate_html 改寫前的實作"""
+    title = " or ".join(genre_names)
+
+    html_content = f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Manga List - {html.escape(title)}</title>
+    <link rel="stylesheet" href="style.css">
+</head>
+<body>
+    <h1>Manga List - {html.escape(title)}</h1>
+    <div class="manga-grid">
+"""
+
+    for manga in manga_list:
+        genres_html = "".join(f'<span>{html.escape(g)}</span>' for g in manga["genres"])
+
+        html_content += f"""
+        <div class="manga-card">
+            <div class="loading" data-img="{html.escape(manga['image'])}">Loading...</div>
+            <div class="manga-title">
+                <a href="{html.escape(manga['url'])}" target="mypage">{html.escape(manga['title'])}</a>
+            </div>
+            <div class="manga-info">
+                Chapters: {manga['chapters'] or 0}
+            </div>
+            <div class="genres">
+                {genres_html}
+            </div>
+        </div>
+"""
+
+    html_content += """
+    </div>
+    <button id="scroll-top">↑ Top</button>
+    <script src="script.js"></script>
+</body>
+</html>
+"""
+
+    output_path = Path(output_dir) / ("_".join(genre_names) + ".html")
+    output_path.write_text(html_content, encoding="utf-8")
+    return output_path
+
+def largest_genre(snapshot_path):
+    if snapshot_path:
+        from catalog_snapshot import CatalogSnapshot
+        snapshot = CatalogSnapshot.load(snapshot_path)
+        genre, _ = snapshot.genre_counts()[0]
+        return genre, snapshot.get_manga_by_genres([genre])
+
+    manga_list = [{
+        "title": f"テスト漫画タイトル {i} ～サブタイトル～",
+        "url": f"https://jmanga.se/read/test-{i}-raw/",
+        "image": f"https://imgjm.jmanga.ac/thumb/300/upload/2024/05/{i:032x}.jpeg",
+        "chapters": 5000 - i,
+        "genres": ["ファンタジー", "異世界", "恋愛", "コメディ", "アクション"],
+    } for i in range(5000)]
+    return "ファンタジー", manga_list
+
+def timed(render, genre, manga_list, output_dir, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        path = render([genre], manga_list, output_dir)
+    return (time.perf_counter() - start) / rounds, path.read_bytes()
+
+def main():
+    snapshot_path = sys.argv[1] if len(sys.argv) > 1 else None
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    genre, manga_list = largest_genre(snapshot_path)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        before, legacy_output = timed(legacy_render, genre, manga_list, output_dir, rounds)
+        after, new_output = timed(render_genre_page, genre, manga_list, output_dir, rounds)
+
+    print(f"Genre: {genre} ({len(manga_list)} manga, {rounds} rounds)")
+    print(f"before (string +=):        {before * 1000:8.1f} ms/page")
+    print(f"after  (compiled, stream): {after * 1000:8.1f} ms/page")
+    print(f"identical output: {legacy_output == new_output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+from pathlib import Path
+import fnmatch
+import json
+from crawl_state import content_hash
+
+class BuildManifest:
+    """
+    記錄每個輸出頁面上次建置時的輸入 hash (以輸出路徑為 key)，
+    輸入沒變且輸出檔仍存在時略過重新渲染與寫入
+    """
+
+    def __init__(self, path=Path("docs") / "build_manifest.json", force=False):
+        self.path = Path(path)
+        self.force = force
+        self.entries = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+            # 舊格式的 key ("html:<genre>" 等) 不是輸出路徑，直接捨棄，下次建置重新記錄
+            self.entries = {key: value for key, value in self.entries.items() if ":" not in key}
+        self.built = 0
+        self.skipped = 0
+
+    @staticmethod
+    def key(output_path):
+        return Path(output_path).as_posix()
+
+    def check(self, key, inputs, output_path):
+        """Return the input hash when `key` needs rebuilding, or None when it is up to date."""
+        input_hash = content_hash(inputs)
+        if not self.force and self.entries.get(key) == input_hash and Path(output_path).exists():
+            self.skipped += 1
+            return None
+        return input_hash
+
+    def record(self, key, input_hash):
+        self.entries[key] = input_hash
+        self.built += 1
+
+    def build(self, key, inputs, output_path, render):
+        """Call render() unless `inputs` hash to the same value as the last build of `key`."""
+        input_hash = self.check(key, inputs, output_path)
+        if input_hash is None:
+            return False
+        render()
+        self.record(key, input_hash)
+        return True
+
+    def prune(self, pattern, keep):
+        """移除符合 pattern 但不在 keep 中的 key (已不再產生的頁面)，回傳被移除的 key"""
+        stale = [key for key in self.entries if fnmatch.fnmatch(key, pattern) and key not in keep]
+        for key in stale:
+            del self.entries[key]
+        return stale
+
+    def save(self):
+        self.path.parent.mkdir(exist_ok=True)
+        self.path.write_text(json.dumps(self.entries, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+        return self.path
@@ -0,0 +1,46 @@
+from db_repository import get_repository
+from collections import defaultdict
+from pathlib import Path
+import json
+
+class CatalogSnapshot:
+    """
+    所有漫畫及其 genres 的記憶體快照，以一次查詢取得 (或從本地 JSON Lines 檔載入)，
+    並建立 genre -> 漫畫 的索引，讓每個 genre 頁面不需再各自查詢資料庫
+    """
+
+    def __init__(self, manga):
+        # 依章節數由多到少排序，與 MangaQuery 的 ORDER BY m.chapters DESC 一致 (Neo4j 的 null 排在最前面)
+        self.manga = sorted(manga, key=lambda m: (m["chapters"] is not None, -(m["chapters"] or 0)))
+        self.by_genre = defaultdict(list)
+        for index, m in enumerate(self.manga):
+            for genre in m["genres"]:
+                self.by_genre[genre].append(index)
+
+    @classmethod
+    def from_backend(cls, backend=None):
+        """依 config.CATALOG_BACKEND 從 Neo4j 或本地 SQLite 取得快照 (資料未變動時由讀取快取取得)"""
+        return cls(get_repository(backend).get_all_manga())
+
+    @classmethod
+    def load(cls, path="catalog.jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def save(self, path="catalog.jsonl"):
+        with open(path, "w", encoding="utf-8") as f:
+            for m in self.manga:
+                f.write(json.dumps(m, ensure_ascii=False) + "\n")
+        return Path(path).absolute()
+
+    def genre_counts(self):
+        """[(genre, manga_count)]，由多到少排序"""
+        counts = [(genre, len(indices)) for genre, indices in self.by_genre.items()]
+        return sorted(counts, key=lambda c: -c[1])
+
+    def get_manga_by_genres(self, genre_names):
+        """任一 genre 符合的漫畫 (OR)，依章節數排序"""
+        indices = set()
+        for genre in genre_names:
+            indices.update(self.by_genre.get(genre, []))
+        return [self.manga[i] for i in sorted(indices)]
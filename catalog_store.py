@@ -0,0 +1,182 @@
+from pathlib import Path
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from crawl_state import content_hash
+
+class CatalogStore:
+    """
+    所有漫畫詳細資料集中在一個 SQLite 檔，取代 docs_jmanga/ 中每部漫畫一個 indent=2 的 JSON 文件
+
+    - 以 URL 為 primary key，get() 直接查詢
+    - iter_manga() 依寫入順序 (rowid) 逐筆讀取，整個目錄只需要一次循序讀取
+    - import_dir() / export_dir() 與原本的每檔一部漫畫格式互相轉換，
+      每筆記錄來源目錄 (docs_jmanga、docs_imported ...)，匯出時寫回原本的目錄
+    """
+
+    DEFAULT_DIRECTORY = "docs_jmanga"
+
+    def __init__(self, path="catalog_store.db"):
+        self.path = Path(path)
+        # json_fill_short 的 worker threads 在 lock 內寫入
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS manga (
+                url TEXT PRIMARY KEY,
+                filename TEXT,
+                directory TEXT,
+                title TEXT NOT NULL,
+                short_title TEXT NOT NULL DEFAULT '',
+                content_hash TEXT NOT NULL,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(manga)")}
+        if "directory" not in columns:
+            # 舊版的 store 沒有來源目錄，視為 DEFAULT_DIRECTORY
+            self.conn.execute("ALTER TABLE manga ADD COLUMN directory TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS manga_short_title ON manga (short_title)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT count(*) FROM manga").fetchone()[0]
+
+    def get(self, url):
+        row = self.conn.execute("SELECT data FROM manga WHERE url = ?", (url,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def normalize_directory(directory):
+        return os.path.normpath(str(directory))
+
+    def put(self, manga, filename=None, directory=None):
+        """
+        新增或更新一部漫畫 (不自動 commit)；內容沒變時不寫入。
+        filename / directory 為 None 時保留原本記錄的值
+
+        Returns:
+            True 表示有寫入
+        """
+        digest = content_hash(manga)
+        row = self.conn.execute("SELECT content_hash FROM manga WHERE url = ?", (manga["url"],)).fetchone()
+        if row and row[0] == digest:
+            return False
+        self.conn.execute("""
+            INSERT INTO manga (url, filename, directory, title, short_title, content_hash, data, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                filename = coalesce(excluded.filename, manga.filename),
+                directory = coalesce(excluded.directory, manga.directory),
+                title = excluded.title,
+                short_title = excluded.short_title,
+                content_hash = excluded.content_hash,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+        """, (manga["url"], filename, directory and self.normalize_directory(directory), manga["title"], manga.get("short_title") or "", digest,
+              json.dumps(manga, ensure_ascii=False, separators=(",", ":")), time.time()))
+        return True
+
+    def iter_manga(self, batch_size=1000):
+        """依寫入順序逐筆產生漫畫 dict，不一次載入全部"""
+        cursor = self.conn.execute("SELECT data FROM manga ORDER BY rowid")
+        while rows := cursor.fetchmany(batch_size):
+            for (data,) in rows:
+                yield json.loads(data)
+
+    def short_title(self, url):
+        row = self.conn.execute("SELECT short_title FROM manga WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else ""
+
+    def pending_short_titles(self):
+        """還沒有 short_title 的 [(url, title)]"""
+        return self.conn.execute("SELECT url, title FROM manga WHERE short_title = '' ORDER BY rowid").fetchall()
+
+    def known_short_titles(self):
+        """[(title, short_title)]，用於預先填入 short title 快取"""
+        return self.conn.execute("SELECT title, short_title FROM manga WHERE short_title <> ''").fetchall()
+
+    def set_short_title(self, url, short):
+        manga = self.get(url)
+        if manga is not None:
+            manga["short_title"] = short
+            self.put(manga)
+            self.conn.commit()
+
+    def import_dir(self, directory):
+        """匯入每檔一部漫畫的目錄 (例如 docs_jmanga/)，回傳 (讀取數, 寫入數)"""
+        read = written = 0
+        for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+            if not entry.name.endswith(".json"):
+                continue
+            with open(entry.path, "r", encoding="utf-8") as f:
+                manga = json.load(f)
+            read += 1
+            written += self.put(manga, filename=entry.name, directory=directory)
+        self.conn.commit()
+        return read, written
+
+    def directories(self):
+        """store 中記錄的來源目錄"""
+        rows = self.conn.execute("SELECT DISTINCT coalesce(directory, ?) FROM manga", (self.DEFAULT_DIRECTORY,))
+        return sorted(directory for (directory,) in rows)
+
+    def export_dir(self, directory):
+        """
+        把來源是 directory 的漫畫匯出成每檔一部漫畫的 indent=2 JSON (檔名沿用匯入時的名稱)，
+        內容沒變的文件不重寫
+        """
+        source = self.normalize_directory(directory)
+        directory = Path(directory)
+        directory.mkdir(exist_ok=True)
+        written = 0
+        for filename, data in self.conn.execute("SELECT filename, data FROM manga WHERE coalesce(directory, ?) = ? "
+                                                "ORDER BY rowid", (self.DEFAULT_DIRECTORY, source)):
+            manga = json.loads(data)
+            if not filename:
+                # 沒有記錄檔名時使用與 json_jmanga 相同的命名 (只在需要時載入爬蟲模組)
+                from json_jmanga import safe_filename
+                filename = f"{safe_filename(manga['title'])}.json"
+            path = directory / filename
+            text = json.dumps(manga, ensure_ascii=False, indent=2)
+            if path.exists() and path.read_text(encoding="utf-8") == text:
+                continue
+            path.write_text(text, encoding="utf-8")
+            written += 1
+        return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between catalog_store.db and per-manga JSON files")
+    parser.add_argument("command", choices=["import", "export", "stats"])
+    parser.add_argument("dirs", nargs="*",
+                        help="directories to import (default docs_jmanga) or export (default: every recorded one)")
+    parser.add_argument("--store", default="catalog_store.db")
+    args = parser.parse_args()
+
+    store = CatalogStore(args.store)
+    try:
+        if args.command == "import":
+            for directory in args.dirs or [CatalogStore.DEFAULT_DIRECTORY]:
+                read, written = store.import_dir(directory)
+                print(f"Imported {directory}: {read} files read, {written} new or changed")
+        elif args.command == "export":
+            for directory in args.dirs or store.directories():
+                print(f"Exported to {directory}: {store.export_dir(directory)} files written")
+        print(f"{store.path}: {len(store)} manga, {len(store.pending_short_titles())} without short title")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
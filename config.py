@@ -0,0 +1,27 @@
+import os
+
+# 目錄資料來源：
+#   neo4j  - 遠端 Neo4j (預設)
+#   sqlite - 本地 SQLite 檔 (db_sqlite.SqliteCatalog)，由 db_import --backend sqlite 建立
+# 可用環境變數 (或 .env) 覆寫
+CATALOG_BACKEND = os.environ.get("JMANGA_BACKEND", "neo4j")
+SQLITE_PATH = os.environ.get("JMANGA_SQLITE_PATH", "catalog.db")
+
+BACKENDS = ("neo4j", "sqlite")
+
+def use_sqlite(backend=None):
+    backend = backend or CATALOG_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown catalog backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    return backend == "sqlite"
+
+# Neo4j 連線 (所有模組共用 db_repository.get_driver() 的同一個 driver)
+NEO4J_URI = os.environ.get("NEO4J_URI", "bolt://solarsuna.com:37687")
+NEO4J_USER = os.environ.get("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD", "jack1234")
+NEO4J_POOL_SIZE = int(os.environ.get("NEO4J_POOL_SIZE", "16"))
+
+# 讀取查詢的快取檔，JMANGA_QUERY_CACHE=0 停用
+# 快取以 import generation 判斷是否過期，不經過 db_import / db_refine 的手動修改 (cypher.cmd) 需要停用快取或遞增 generation
+QUERY_CACHE_PATH = os.environ.get("JMANGA_QUERY_CACHE_PATH", ".query_cache.db")
+QUERY_CACHE = os.environ.get("JMANGA_QUERY_CACHE", "1") != "0"
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Optional
+
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+def content_hash(data) -> str:
+    """Stable hash of a JSON-serialisable record."""
+    payload = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CrawlState:
+    """
+    以漫畫 URL 為 key 的爬取狀態
+
+    list_hash     列表頁上該漫畫項目的內容 hash (含最新章節等資訊)
+    chapter_count 上次抓取詳細頁面時的章節數
+    content_hash  上次儲存的詳細資料 hash
+    """
+
+    def __init__(self, path="crawl_state.db"):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS manga (
+                url TEXT PRIMARY KEY,
+                title TEXT,
+                list_hash TEXT,
+                chapter_count INTEGER,
+                content_hash TEXT,
+                last_seen REAL,
+                last_fetched REAL
+            )
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def get_content_hash(self, url: str) -> Optional[str]:
+        row = self.conn.execute("SELECT content_hash FROM manga WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def classify(self, url: str, list_hash: str) -> str:
+        """Compare a list-page entry against the stored state."""
+        row = self.conn.execute("SELECT list_hash FROM manga WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return NEW
+        return UNCHANGED if row[0] == list_hash else CHANGED
+
+    def mark_seen(self, url: str, title: str, list_hash: str):
+        """Record a list-page entry without fetching its details."""
+        self.conn.execute("""
+            INSERT INTO manga (url, title, list_hash, last_seen) VALUES (?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                title = excluded.title,
+                list_hash = excluded.list_hash,
+                last_seen = excluded.last_seen
+        """, (url, title, list_hash, time.time()))
+
+    def mark_fetched(self, url: str, title: str, list_hash: str, chapter_count: int, detail_hash: str):
+        now = time.time()
+        self.conn.execute("""
+            INSERT INTO manga (url, title, list_hash, chapter_count, content_hash, last_seen, last_fetched)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                title = excluded.title,
+                list_hash = excluded.list_hash,
+                chapter_count = excluded.chapter_count,
+                content_hash = excluded.content_hash,
+                last_seen = excluded.last_seen,
+                last_fetched = excluded.last_fetched
+        """, (url, title, list_hash, chapter_count, detail_hash, now, now))
+
+    def commit(self):
+        self.conn.commit()
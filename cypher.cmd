@@ -138,3 +138,8 @@ return g1.name, g2.name, m1.name, m2.name
 
 MERGE (m2)-[:HAS_GENRE]->(g1)
 DETACH DELETE g2
+
+# 手動修改後遞增 import generation，讓 db_repository 的讀取快取失效
+    MERGE (g:ImportGeneration {name: 'catalog'})
+    SET g.value = coalesce(g.value, 0) + 1
+    RETURN g.value
@@ -1,106 +1,98 @@
-from neo4j import GraphDatabase
+import argparse
 import csv
+import time
+from collections import Counter
 from pathlib import Path
-import html
+from html_render import render_check_page
+from db_repository import get_repository
+from catalog_snapshot import CatalogSnapshot
+from genre_query import GenreIndex
 
 class GenreChecker:
-    def __init__(self, uri="bolt://solarsuna.com:37687", user="neo4j", password="jack1234"):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
-        self.major_genres = set()  # manga_count >= 100 的 genres
-        self.load_genres()
-
-    def close(self):
-        self.driver.close()
+    def __init__(self, repository=None, backend=None, threshold=100):
+        self.repository = repository or get_repository(backend)
+        self.threshold = threshold
+        self.major_genres = set()  # manga_count >= threshold 的 genres
 
     def load_genres(self):
         """從 genre.csv 讀取並分類 genres"""
         with open('genre.csv', 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
-                if int(row['manga_count']) >= 100:
+                if int(row['manga_count']) >= self.threshold:
                     self.major_genres.add(row['genre'])
 
+    def write_report(self, result, minor_genres=None):
+        # 保存 HTML 文件，結果邊讀取邊寫入
+        output_dir = Path("docs")
+        output_dir.mkdir(exist_ok=True)
+        output_path = output_dir / "check.html"
+        count = render_check_page(result, self.major_genres, self.threshold, output_path, minor_genres)
+
+        print(f"Report generated: {output_path}")
+        print(f"Total manga without major genres: {count}")
+
     def check_manga_without_major_genres(self):
-        """檢查沒有主要 genre 的漫畫並生成 HTML 報告"""
-        with self.driver.session() as session:
-            result = session.run("""
-                MATCH (m:Manga)
-                WITH m, [(m)-[:HAS_GENRE]->(g:Genre) | g.name] as genres
-                WHERE NONE(genre IN genres WHERE genre IN $major_genres)
-                RETURN m.name as manga_name, 
-                       m.title as title,
-                       m.image as image,
-                       m.chapters as chapters,
-                    
-                       genres
-                ORDER BY m.chapters DESC
-            """, major_genres=list(self.major_genres))
+        """檢查沒有主要 genre 的漫畫並生成 HTML 報告 (genre.csv + 資料庫查詢)"""
+        self.load_genres()
+        self.write_report(self.repository.get_manga_without_major_genres(self.major_genres))
+
+    def check_snapshot(self, snapshot, top=30, genreless=None):
+        """
+        由記憶體快照計算涵蓋率：major genres 的 bitmap 做 OR，取補集就是未涵蓋的漫畫，
+        不需要 genre.csv 也不需要掃描整個圖
 
-            # 生成 HTML 內容
-            html_content = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <title>Manga Without Major Genres</title>
-    <link rel="stylesheet" href="style.css">
-</head>
-<body>
-    <h1>Manga Without Major Genres</h1>
-    <div class="info">
-        <h2>Major Genres (manga_count >= 100):</h2>
-        <div class="genres">
-            {', '.join(sorted(list(self.major_genres)))}
-        </div>
-    </div>
-    <div class="manga-grid">
-"""
-            count = 0
-            for record in result:
-                count += 1
-                genres_html = "".join(f'<span>{html.escape(g)}</span>' for g in record['genres'])
-                
-                html_content += f"""
-        <div class="manga-card">
-            <div class="loading" data-img="{html.escape(record['image'])}">Loading...</div>
-            <div class="manga-title">
-                <a href="https://jmanga.se/read/{record['manga_name']}-raw/" target="mypage">{html.escape(record['title'])}</a>
-            </div>
-            <div class="manga-info">
-                Chapters: {record['chapters'] or 0}
-            </div>
-            <div class="genres">
-                {genres_html}
-            </div>
-        </div>
-"""
+        快照只包含有 genre 的漫畫，完全沒有 genre 的漫畫由 genreless 另外傳入，
+        一起列在報告中 (None 表示無法取得)
 
-            html_content += f"""
-    </div>
-    <div class="summary">
-        Total: {count} manga without major genres
-    </div>
-    <button id="scroll-top">↑ Top</button>
-    <script src="script.js"></script>
-</body>
-</html>
-"""
+        Returns:
+            [(genre, count)] 未涵蓋漫畫上最常出現的 minor genres
+        """
+        start = time.perf_counter()
+        index = GenreIndex(snapshot)
+        self.major_genres = {genre for genre, count in snapshot.genre_counts() if count >= self.threshold}
+        covered = 0
+        for genre in self.major_genres:
+            covered |= index.bitmaps[genre]
+        uncovered = [snapshot.manga[i] for i in index.indices(index.all_bits & ~covered)]
+        minor_genres = Counter(genre for manga in uncovered for genre in manga["genres"]).most_common(top)
+        total = len(snapshot.manga) + len(genreless or [])
+        print(f"Coverage computed in {time.perf_counter() - start:.3f}s: "
+              f"{len(snapshot.manga) - len(uncovered)}/{total} manga have a major genre "
+              f"({len(self.major_genres)} genres with >= {self.threshold} manga)")
+        if genreless is None:
+            print("  Manga without any genre are not in the snapshot and are not listed")
+        else:
+            print(f"  {len(genreless)} manga have no genre at all")
+            uncovered = list(genreless) + uncovered
 
-            # 保存 HTML 文件
-            output_dir = Path("docs")
-            output_dir.mkdir(exist_ok=True)
-            output_path = output_dir / "check.html"
-            output_path.write_text(html_content, encoding="utf-8")
-            
-            print(f"Report generated: {output_path}")
-            print(f"Total manga without major genres: {count}")
+        # 合併到 major genre 的候選 (genre_rules.json 的 merge 規則)
+        for genre, count in minor_genres:
+            print(f"  {genre}: {count}")
+
+        self.write_report(uncovered, minor_genres)
+        return minor_genres
 
 def main():
-    checker = GenreChecker()
-    try:
+    parser = argparse.ArgumentParser(description="Report manga without any major genre")
+    parser.add_argument("--threshold", type=int, default=100,
+                        help="genres with at least this many manga count as major")
+    parser.add_argument("--snapshot", help="catalog snapshot (JSON Lines) instead of the configured backend")
+    parser.add_argument("--top", type=int, default=30, help="minor genres to list for uncovered manga")
+    parser.add_argument("--legacy", action="store_true",
+                        help="read major genres from genre.csv and query the database for uncovered manga")
+    args = parser.parse_args()
+
+    checker = GenreChecker(threshold=args.threshold)
+    if args.legacy:
         checker.check_manga_without_major_genres()
-    finally:
-        checker.close()
+    else:
+        if args.snapshot:
+            snapshot, genreless = CatalogSnapshot.load(args.snapshot), None
+        else:
+            snapshot = CatalogSnapshot.from_backend()
+            genreless = checker.repository.get_manga_without_genres()
+        checker.check_snapshot(snapshot, args.top, genreless)
 
 if __name__ == "__main__":
     main()
@@ -1,17 +1,25 @@
-from neo4j import GraphDatabase
+from neo4j.exceptions import ClientError, DatabaseError, ServiceUnavailable, SessionExpired
+from concurrent.futures import ThreadPoolExecutor
+import argparse
 import json
 import os
-    
-# Neo4j 连接信息
-uri = "bolt://solarsuna.com:37687"  # 更改为你的 Neo4j 地址
-username = "neo4j"
-password = "jack1234"  # 更改为你的密码
+import queue
+import threading
+import time
+from crawl_state import content_hash
+from catalog_store import CatalogStore
+from genre_rules import GenreNormalizer
+from db_sqlite import SqliteCatalog
+from db_repository import get_driver, get_repository
+import config
+
+# Neo4j 连接信息在 config.py (NEO4J_URI / NEO4J_USER / NEO4J_PASSWORD 环境变量)
 
 # JSON 文件目录
 json_dir = "./docs_jmanga/"  # 更改为你的 JSON 文件目录
 
-# 创建 Neo4j 驱动程序实例
-driver = GraphDatabase.driver(uri, auth=(username, password))
+# 匯入前先依 genre_rules.json 正規化 genre，不需要再事後執行 db_refine
+genre_normalizer = GenreNormalizer.from_file()
 
 # 定义 Cypher 查询
 def create_manga_entity(tx, manga):
@@ -60,16 +68,381 @@ def create_manga_entity(tx, manga):
     )
 
 
-files = [ fname for fname in os.listdir(json_dir) if fname.endswith(".json") ]
+# 與 create_manga_entity 相同的邏輯，但一次處理一整批資料
+BULK_CYPHER = """
+UNWIND $rows AS row
+MERGE (m:Manga {url: row.url})
+WITH m, row
+WHERE m.name IS NULL OR m.name = ''
+
+SET m += {
+    name: row.short_title,
+    title: row.title,
+    chapters: toInteger(row.chapter_count),
+    image: row.image
+}
+
+FOREACH (genre IN row.genres |
+    MERGE (g:Genre {name: genre})
+    MERGE (m)-[:HAS_GENRE]->(g)
+)
+
+FOREACH (relatedManga IN row.related_manga |
+    MERGE (rm:Manga {url: relatedManga.url})
+    ON CREATE SET rm.title = relatedManga.title
+    MERGE (m)-[:RELATED_TO]->(rm)
+)
+"""
+
+def create_manga_entities(tx, rows):
+    tx.run(BULK_CYPHER, rows=rows)
+
+# 更新有變動的漫畫：覆寫屬性並只增刪有差異的 genre / related manga 關係
+SYNC_CYPHER = """
+UNWIND $rows AS row
+MERGE (m:Manga {url: row.url})
+SET m.name = CASE WHEN row.short_title <> '' THEN row.short_title ELSE coalesce(m.name, '') END,
+    m.title = row.title,
+    m.chapters = toInteger(row.chapter_count),
+    m.image = row.image,
+    m.content_hash = row.content_hash
+
+WITH m, row
+OPTIONAL MATCH (m)-[r:HAS_GENRE]->(g:Genre)
+WHERE NOT g.name IN row.genres
+WITH m, row, collect(r) AS staleGenres
+FOREACH (r IN staleGenres | DELETE r)
+
+WITH m, row, [(m)-[:HAS_GENRE]->(g:Genre) | g.name] AS currentGenres
+FOREACH (genre IN [x IN row.genres WHERE NOT x IN currentGenres] |
+    MERGE (g:Genre {name: genre})
+    MERGE (m)-[:HAS_GENRE]->(g)
+)
+
+WITH m, row, [x IN row.related_manga | x.url] AS relatedUrls
+OPTIONAL MATCH (m)-[r:RELATED_TO]->(rm:Manga)
+WHERE NOT rm.url IN relatedUrls
+WITH m, row, collect(r) AS staleRelated
+FOREACH (r IN staleRelated | DELETE r)
+
+WITH m, row, [(m)-[:RELATED_TO]->(rm:Manga) | rm.url] AS currentRelated
+FOREACH (relatedManga IN [x IN row.related_manga WHERE NOT x.url IN currentRelated] |
+    MERGE (rm:Manga {url: relatedManga.url})
+    ON CREATE SET rm.title = relatedManga.title
+    MERGE (m)-[:RELATED_TO]->(rm)
+)
+"""
 
-# 遍历 JSON 文件并导入数据
-with driver.session() as session:
-    for filename in files:
-        file_path = os.path.join(json_dir, filename)
+def get_content_hashes(tx, urls):
+    result = tx.run("""
+        UNWIND $urls AS url
+        MATCH (m:Manga {url: url})
+        RETURN m.url AS url, m.content_hash AS content_hash
+    """, urls=urls)
+    return {record["url"]: record["content_hash"] for record in result}
+
+def sync_manga_entities(tx, rows):
+    tx.run(SYNC_CYPHER, rows=rows)
+
+def create_schema(driver):
+    """建立 Manga.url 與 Genre.name 的唯一性約束，失敗時 (例如已有重複資料) 退回一般索引"""
+    schema = [
+        ("CREATE CONSTRAINT manga_url IF NOT EXISTS FOR (m:Manga) REQUIRE m.url IS UNIQUE",
+         "CREATE INDEX manga_url_index IF NOT EXISTS FOR (m:Manga) ON (m.url)"),
+        ("CREATE CONSTRAINT genre_name IF NOT EXISTS FOR (g:Genre) REQUIRE g.name IS UNIQUE",
+         "CREATE INDEX genre_name_index IF NOT EXISTS FOR (g:Genre) ON (g.name)"),
+    ]
+    with driver.session() as session:
+        for constraint, index in schema:
+            try:
+                session.run(constraint).consume()
+            except (ClientError, DatabaseError) as e:
+                # 已有重複資料時是 Neo.DatabaseError.Schema.ConstraintCreationFailed
+                print(f"Constraint failed ({e.code}), creating index instead")
+                session.run(index).consume()
+
+def to_row(manga):
+    """只保留匯入需要的欄位"""
+    return {
+        "url": manga["url"],
+        "title": manga["title"],
+        "short_title": manga["short_title"],
+        "chapter_count": manga["chapter_count"],
+        "image": manga["image"],
+        # 排序後各交易以相同順序鎖定 Genre 節點，減少 deadlock
+        "genres": sorted(genre_normalizer.normalize_genres(manga["genres"])),
+        "related_manga": manga.get("related_manga") or [],
+    }
+
+def iter_json_files(files):
+    for file_path in files:
         with open(file_path, "r", encoding="utf-8") as f:
-            manga_data = json.load(f)
-            session.execute_write(create_manga_entity, manga_data)
-            print(f"Imported: {filename}")
+            yield json.load(f)
+
+def iter_batches(files, batch_size):
+    """逐一讀取 JSON 文件 (或 CatalogStore 的循序讀取)，每 batch_size 筆產生一批"""
+    batch = []
+    records = files.iter_manga() if isinstance(files, CatalogStore) else iter_json_files(files)
+    for manga in records:
+        batch.append(to_row(manga))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def list_files(json_dir):
+    return [os.path.join(json_dir, fname) for fname in os.listdir(json_dir) if fname.endswith(".json")]
+
+def import_files(driver, files):
+    # 遍历 JSON 文件并导入数据
+    with driver.session() as session:
+        for file_path in files:
+            with open(file_path, "r", encoding="utf-8") as f:
+                manga_data = genre_normalizer.apply(json.load(f))
+                session.execute_write(create_manga_entity, manga_data)
+                print(f"Imported: {os.path.basename(file_path)}")
+
+def bulk_import(driver, files, batch_size=500):
+    create_schema(driver)
+
+    total = 0
+    start = time.perf_counter()
+    with driver.session() as session:
+        for batch in iter_batches(files, batch_size):
+            session.execute_write(create_manga_entities, batch)
+            total += len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"Imported {total}/{len(files)} rows ({total / elapsed:.1f} rows/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Bulk import finished: {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.1f} rows/s)")
+    return total
+
+def pipeline_import(driver, files, batch_size=500, parse_workers=4, writers=2, queue_size=8):
+    """
+    parse_workers 個執行緒讀取並正規化 JSON 文件，writers 個執行緒各自以獨立 session 寫入 Neo4j，
+    中間以大小為 queue_size 的 queue 連接，寫入跟不上時解析端會被擋住 (backpressure)。
+    writer 的連線失敗時把手上的 batch 放回 queue 交給其他 writer，所有 writer 都停止後才清空 queue
+    """
+    create_schema(driver)
+
+    batches = queue.Queue(maxsize=queue_size)
+    chunks = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
+    lock = threading.Lock()
+    stats = {"rows": 0, "failed": 0, "alive": writers, "sentinels": 0}
+    writer_errors = []
+    start = time.perf_counter()
+
+    def parse_chunk(chunk):
+        batch = []
+        for file_path in chunk:
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    batch.append(to_row(json.load(f)))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping {file_path}: {e}")
+        if batch:
+            batches.put(batch)
+
+    def fail(batch):
+        with lock:
+            stats["failed"] += len(batch)
+
+    def stop_writer(batch, error):
+        """連線失敗的 writer：batch 交給還活著的 writer；最後一個停止的 writer 負責清空 queue"""
+        with lock:
+            writer_errors.append(error)
+            stats["alive"] -= 1
+        print(f"Writer stopped: {error}")
+        while batch is not None:
+            with lock:
+                alive = stats["alive"]
+            if not alive:
+                fail(batch)
+                break
+            try:
+                batches.put(batch, timeout=1)
+                batch = None
+            except queue.Full:
+                pass
+
+        # 沒有 writer 時繼續取出 queue，解析端與結束時放入的 None 才不會卡住
+        while True:
+            with lock:
+                if stats["alive"] or stats["sentinels"] == writers:
+                    return
+            try:
+                item = batches.get(timeout=1)
+            except queue.Empty:
+                continue
+            if item is None:
+                with lock:
+                    stats["sentinels"] += 1
+            else:
+                fail(item)
+
+    def write_loop():
+        batch = None
+        try:
+            with driver.session() as session:
+                while True:
+                    batch = batches.get()
+                    if batch is None:
+                        with lock:
+                            stats["sentinels"] += 1
+                            stats["alive"] -= 1
+                        return
+                    try:
+                        # execute_write 本身會重試 deadlock 等暫時性錯誤
+                        session.execute_write(create_manga_entities, batch)
+                        with lock:
+                            stats["rows"] += len(batch)
+                            elapsed = time.perf_counter() - start
+                            print(f"Imported {stats['rows']}/{len(files)} rows ({stats['rows'] / elapsed:.1f} rows/s)")
+                    except (ServiceUnavailable, SessionExpired):
+                        # 連線層級的錯誤：這個 writer 停止，batch 交給其他 writer
+                        raise
+                    except Exception as e:
+                        fail(batch)
+                        print(f"Failed to write batch of {len(batch)} rows: {e}")
+                    batch = None
+        except Exception as e:
+            stop_writer(batch, e)
+
+    writer_threads = [threading.Thread(target=write_loop) for _ in range(writers)]
+    for thread in writer_threads:
+        thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=parse_workers) as pool:
+            for future in [pool.submit(parse_chunk, chunk) for chunk in chunks]:
+                future.result()
+    finally:
+        # 提早停止的 writer 不會取走 None，所有 writer 都結束後就不再放入
+        for _ in writer_threads:
+            while any(thread.is_alive() for thread in writer_threads):
+                try:
+                    batches.put(None, timeout=1)
+                    break
+                except queue.Full:
+                    pass
+        for thread in writer_threads:
+            thread.join()
+
+    # 在最後一個 None 之後才放回 queue 的 batch 沒有 writer 會處理
+    while not batches.empty():
+        item = batches.get_nowait()
+        if item is not None:
+            fail(item)
+
+    if len(writer_errors) == writers:
+        raise writer_errors[0]
+    elapsed = time.perf_counter() - start
+    print(f"Pipeline import finished: {stats['rows']} rows in {elapsed:.1f}s "
+          f"({stats['rows'] / max(elapsed, 1e-9):.1f} rows/s), {stats['failed']} rows failed"
+          f"{f', {len(writer_errors)} writers stopped' if writer_errors else ''}")
+    return stats["rows"]
+
+def sync_import(driver, files, batch_size=500):
+    """只寫入 content hash 與資料庫中不同的漫畫，未變動的直接略過"""
+    create_schema(driver)
+
+    stats = {"skipped": 0, "updated": 0}
+    start = time.perf_counter()
+    with driver.session() as session:
+        for batch in iter_batches(files, batch_size):
+            for row in batch:
+                row["content_hash"] = content_hash(row)
+            existing = session.execute_read(get_content_hashes, [row["url"] for row in batch])
+            changed = [row for row in batch if existing.get(row["url"]) != row["content_hash"]]
+            if changed:
+                session.execute_write(sync_manga_entities, changed)
+            stats["updated"] += len(changed)
+            stats["skipped"] += len(batch) - len(changed)
+            print(f"Updated {stats['updated']}, skipped {stats['skipped']} unchanged")
+
+    elapsed = time.perf_counter() - start
+    print(f"Sync import finished in {elapsed:.1f}s: {stats['updated']} updated, {stats['skipped']} unchanged")
+    return stats
+
+def sqlite_import(files, batch_size=500, path=None):
+    """匯入本地 SQLite 目錄 (config.SQLITE_PATH)，與 sync_import 一樣略過 content hash 未變的漫畫"""
+    catalog = SqliteCatalog(path)
+    stats = {"skipped": 0, "updated": 0}
+    start = time.perf_counter()
+    try:
+        for batch in iter_batches(files, batch_size):
+            for row in batch:
+                row["content_hash"] = content_hash(row)
+            existing = catalog.get_content_hashes([row["url"] for row in batch])
+            changed = [row for row in batch if existing.get(row["url"]) != row["content_hash"]]
+            stats["updated"] += catalog.sync_rows(changed)
+            stats["skipped"] += len(batch) - len(changed)
+            print(f"Updated {stats['updated']}, skipped {stats['skipped']} unchanged")
+    finally:
+        catalog.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"SQLite import into {catalog.path} finished in {elapsed:.1f}s: "
+          f"{stats['updated']} updated, {stats['skipped']} unchanged")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Import manga JSON files into Neo4j")
+    parser.add_argument("json_dir", nargs="?", default=json_dir)
+    parser.add_argument("--bulk", action="store_true", help="send files in UNWIND batches")
+    parser.add_argument("--sync", action="store_true",
+                        help="skip manga whose content hash is unchanged and update the changed ones")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="parse JSON in this many threads and write through a separate writer pool")
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--backend", choices=config.BACKENDS, default=config.CATALOG_BACKEND,
+                        help="import into Neo4j or the local SQLite catalog (default from JMANGA_BACKEND)")
+    parser.add_argument("--store", help="read from a consolidated catalog store (catalog_store.py) instead of json_dir")
+    args = parser.parse_args()
+    if args.store and args.workers:
+        # store 只能在一個執行緒循序讀取，pipeline 模式無法使用
+        parser.error("--workers cannot be combined with --store (use --bulk or --sync)")
+
+    repository = get_repository(args.backend)
+    store = CatalogStore(args.store) if args.store else None
+    try:
+        run_import(args, store)
+    except BaseException:
+        # 中途失敗前可能已寫入部分資料，仍讓讀取快取失效；
+        # bump 本身也失敗時 (例如根本連不上資料庫) 保留原本的錯誤
+        try:
+            print(f"Import generation: {repository.bump_generation()}")
+        except Exception as e:
+            print(f"Could not bump import generation: {e}")
+        raise
+    else:
+        # 資料已寫入，讓讀取快取失效
+        print(f"Import generation: {repository.bump_generation()}")
+    finally:
+        if store is not None:
+            store.close()
+
+def run_import(args, store=None):
+    # store 只能循序讀取，逐檔匯入改用 bulk
+    files = store if store is not None else list_files(args.json_dir)
+    if config.use_sqlite(args.backend):
+        sqlite_import(files, args.batch_size)
+        return
+
+    # 共用的 Neo4j 驱动程序实例 (连接池)
+    driver = get_driver()
+    if args.sync:
+        sync_import(driver, files, args.batch_size)
+    elif store is not None:
+        bulk_import(driver, files, args.batch_size)
+    elif args.workers:
+        pipeline_import(driver, files, args.batch_size, args.workers, args.writers)
+    elif args.bulk:
+        bulk_import(driver, files, args.batch_size)
+    else:
+        import_files(driver, files)
 
-# 关闭驱动程序
-driver.close()
+if __name__ == "__main__":
+    main()
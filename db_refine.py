@@ -1,11 +1,42 @@
-from neo4j import GraphDatabase
+from db_repository import get_driver, get_repository
+from genre_rules import GenreNormalizer
+import argparse
+import json
 
-class GenreRefiner:
-    def __init__(self, uri="bolt://solarsuna.com:37687", user="neo4j", password="jack1234"):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+def load_rules(path="genre_rules.json"):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# 一次套用所有規則：每個舊 Genre 的漫畫接到新的 Genres 後刪除舊 Genre
+REFINE_CYPHER = """
+UNWIND $rules AS rule
+MATCH (oldGenre:Genre {name: rule.old})
+OPTIONAL MATCH (m:Manga)-[:HAS_GENRE]->(oldGenre)
+WITH oldGenre, rule, collect(m) AS mangas
+
+FOREACH (name IN rule.new |
+    MERGE (newGenre:Genre {name: name})
+    FOREACH (m IN mangas | MERGE (m)-[:HAS_GENRE]->(newGenre))
+)
 
-    def close(self):
-        self.driver.close()
+WITH oldGenre, rule, size(mangas) AS affected
+DETACH DELETE oldGenre
+RETURN rule.old AS old, rule.new AS new, affected
+"""
+
+# dry-run：只計算每條規則會影響的漫畫數
+REFINE_DRY_RUN_CYPHER = """
+UNWIND $rules AS rule
+MATCH (oldGenre:Genre {name: rule.old})
+OPTIONAL MATCH (m:Manga)-[:HAS_GENRE]->(oldGenre)
+RETURN rule.old AS old, rule.new AS new, count(m) AS affected
+"""
+
+class GenreRefiner:
+    def __init__(self, repository=None):
+        # refine 只支援 Neo4j，使用共用的 driver
+        self.repository = repository or get_repository("neo4j")
+        self.driver = get_driver()
 
     def split_genres_with_dot(self):
         with self.driver.session() as session:
@@ -104,53 +135,69 @@ class GenreRefiner:
             print(f"Split genre: {source} -> {', '.join(new_genres)}")
             print(f"Affected manga count: {affected}")
 
+    def refine_all(self, normalizer, dry_run=False, rules_per_tx=None):
+        """
+        以 GenreNormalizer 對資料庫中現有的 Genre 名稱計算所有改寫，
+        用一個 UNWIND 查詢 (或每 rules_per_tx 條規則一個交易) 完成全部 merge 與 split
+
+        Returns:
+            list of (old, new, affected) 每條規則影響的漫畫數
+        """
+        # 寫入前取得最新的 Genre 名稱 (不經過讀取快取)
+        names = self.repository.get_genre_names()
+        with self.driver.session() as session:
+            rules = []
+            for name in names:
+                new = normalizer.normalize(name)
+                if new != (name,) and name not in new:
+                    rules.append({"old": name, "new": list(new)})
+
+            if not rules:
+                print("No genres to refine")
+                return []
+
+            size = rules_per_tx or len(rules)
+            stats = []
+            for i in range(0, len(rules), size):
+                chunk = rules[i:i + size]
+                if dry_run:
+                    records = session.execute_read(
+                        lambda tx: list(tx.run(REFINE_DRY_RUN_CYPHER, rules=chunk)))
+                else:
+                    records = session.execute_write(
+                        lambda tx: list(tx.run(REFINE_CYPHER, rules=chunk)))
+                stats.extend((r["old"], r["new"], r["affected"]) for r in records)
+
+        for old, new, affected in sorted(stats, key=lambda s: -s[2]):
+            print(f"{'[dry-run] ' if dry_run else ''}{old} -> {', '.join(new)}: {affected} manga")
+        print(f"\nTotal rules: {len(stats)}, affected manga links: {sum(s[2] for s in stats)}")
+        return stats
+
 def main():
+    parser = argparse.ArgumentParser(description="Refine genres in Neo4j")
+    parser.add_argument("--dry-run", action="store_true", help="only report per-rule affected counts")
+    parser.add_argument("--rules-per-tx", type=int, default=None)
+    parser.add_argument("--legacy", action="store_true", help="run one query per rule")
+    args = parser.parse_args()
+
     refiner = GenreRefiner()
-    try:
-        print("Starting genre refinement...")
-        
-        # 原有的處理
+    print("Starting genre refinement...")
+    
+    # 規則定義在 genre_rules.json，與匯入時的 GenreNormalizer 共用
+    if args.legacy:
+        rules = load_rules()
         refiner.split_genres_with_dot()
-        refiner.merge_genre("コメディ", ["コメディー", "ラブコメ"])
-        refiner.merge_genre("異世界", ["転生", "異世界モノ"])
-        refiner.merge_genre("恋愛", ["ラブストーリー", "ロマンス", "恋愛ファンタジー", "純愛", "女子高生"])
-        refiner.merge_genre("ドラマ", ["ヒューマンドラマ", "人間ドラマ", "ドラマ化"])
-        refiner.merge_genre("オトナ", ["オトナコミック", "オトナ向け", "成人向け", "大人向け"])
-        refiner.merge_genre("エッチ", ["Ecchi", "お色気", "エロい", "エロ", "巨乳", "爆乳", "むちむち"])
-        refiner.merge_genre("学園", ["学校生活", "先生", "女子校生", "JK", "同級生",
-                                   "女子大生", "学園モノ", "大学生", "高校生", "学生", "k高校生", "女教師"])
-        refiner.merge_genre("SF", ["-SF-"])
-        refiner.merge_genre("青年漫画", ["青年", "青年マンガ"])
-        refiner.merge_genre("少年漫画", ["少年", "少年マンガ"])
-        refiner.merge_genre("少女漫画", ["少女", "少女マンガ"])
-        refiner.merge_genre("女性漫画", ["女性マンガ"])
-        refiner.merge_genre("ミステリー", ["ミステリー/ホラー", "ホラー", "サスペンス", "吸血鬼"])
-        refiner.merge_genre("歴史", ["ロマンスA 超自然的 / 歴史", "古代～飛鳥･奈良", "戦国", "三国志", "歴史的",
-                                   "明治維新", "戦国･安土桃山時代", "幕末", "江戸時代(武士･時代劇)", "近代(明治以降)"])
-        refiner.merge_genre("料理", ["料理･グルメ", "グルメ"])
-        refiner.merge_genre("貴族", ["王様", "王女", "姫"])
-        refiner.merge_genre("小説", ["小説家になろう", "なろう系", "WEB小説", "コミカライズ(小説", "ラノベ"])
-        refiner.merge_genre("ゲーム", ["ゲームコミカライズ", "デスゲーム", "乙女ゲーム", "ゲーム)"])
-        refiner.merge_genre("百合", ["GL"])
-        refiner.merge_genre("アニメ化", ["映画化", "メディア化"])
-        refiner.merge_genre("生活", ["くらし", "日常", "くらし。生活"])
-        refiner.merge_genre("家族", ["妹", "義母", "浮気", "不倫", "姉", "人妻", "幼なじみ", "姉妹"])
-        refiner.merge_genre("特典", ["シーモア限定特典付き", "電子特典付き", "独占配信"])
-        refiner.merge_genre("大賞", ["電子コミック大賞2018", "電子コミック大賞2019", "電子コミック大賞2020", "電子コミック大賞2021", 
-                                   "電子コミック大賞2022", "電子コミック大賞2023", "電子コミック大賞2024", "電子コミック大賞2025"])
-        refiner.merge_genre("ハーレム", ["複数プレイ"])
-        refiner.merge_genre("スポーツ", ["野球･ソフトボール"])
-        refiner.merge_genre("動物", ["ペット"])
-        
-        # 使用新的 split_genre 函數
-        refiner.split_genre("TL小説", ["TL", "小説"])
-        refiner.split_genre("ロマンス小説", ["恋愛", "小説"])
-        refiner.split_genre("BLドラマCD化", ["BL", "ドラマ"])
-        refiner.split_genre("学園コメディ", ["学園", "コメディ"])
-
-        print("Genre refinement completed.")
-    finally:
-        refiner.close()
+        for target, alternatives in rules["merge"].items():
+            refiner.merge_genre(target, alternatives)
+        for source, new_genres in rules["split"].items():
+            refiner.split_genre(source, new_genres)
+    else:
+        refiner.refine_all(GenreNormalizer.from_file(), args.dry_run, args.rules_per_tx)
+
+    if not args.dry_run:
+        # genre 改變後讓 genre 數量、各 genre 列表等讀取快取失效
+        print(f"Import generation: {refiner.repository.bump_generation()}")
+    print("Genre refinement completed.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,301 @@
+from neo4j import GraphDatabase
+from pathlib import Path
+import atexit
+import json
+import sqlite3
+import threading
+
+import config
+from db_sqlite import SqliteCatalog
+
+GENRE_COUNTS_CYPHER = """
+    MATCH (g:Genre)<-[:HAS_GENRE]-(m:Manga)
+    WITH g.name as genre, count(m) as manga_count
+    RETURN genre, manga_count
+    ORDER BY manga_count DESC
+"""
+
+MANGA_BY_GENRE_CYPHER = """
+    MATCH (m:Manga)-[:HAS_GENRE]->(g:Genre {name: $genre_name})
+    OPTIONAL MATCH (m)-[:HAS_GENRE]->(og:Genre)
+    WITH m,
+         collect(DISTINCT og.name) as genres
+    RETURN m.name as name,
+           m.title as title,
+           m.chapters as chapters,
+           m.image as image,
+           m.url as url,
+           genres
+    ORDER BY m.chapters DESC
+"""
+
+MANGA_BY_GENRES_CYPHER = """
+    MATCH (m:Manga)-[:HAS_GENRE]->(g:Genre)
+    WHERE g.name IN $genre_names
+    OPTIONAL MATCH (m)-[:HAS_GENRE]->(og:Genre)
+    WITH m,
+         collect(DISTINCT og.name) as genres
+    RETURN m.name as name,
+           m.title as title,
+           m.chapters as chapters,
+           m.image as image,
+           m.url as url,
+           genres
+    ORDER BY m.chapters DESC
+"""
+
+WITHOUT_MAJOR_GENRES_CYPHER = """
+    MATCH (m:Manga)
+    WITH m, [(m)-[:HAS_GENRE]->(g:Genre) | g.name] as genres
+    WHERE NONE(genre IN genres WHERE genre IN $major_genres)
+    RETURN m.name as manga_name,
+           m.title as title,
+           m.image as image,
+           m.chapters as chapters,
+           genres
+    ORDER BY m.chapters DESC
+"""
+
+ALL_MANGA_CYPHER = """
+    MATCH (m:Manga)-[:HAS_GENRE]->(g:Genre)
+    WITH m, collect(DISTINCT g.name) as genres
+    RETURN m.name as name,
+           m.title as title,
+           m.chapters as chapters,
+           m.image as image,
+           m.url as url,
+           genres
+"""
+
+# 已匯入但沒有任何 genre 的漫畫 (related manga 的 stub 只有 url / title，排除在外)
+WITHOUT_GENRES_CYPHER = """
+    MATCH (m:Manga)
+    WHERE NOT (m)-[:HAS_GENRE]->(:Genre)
+      AND (m.chapters IS NOT NULL OR m.image IS NOT NULL)
+    RETURN m.name as name,
+           m.title as title,
+           m.chapters as chapters,
+           m.image as image,
+           m.url as url,
+           [] as genres
+    ORDER BY m.chapters DESC
+"""
+
+# 匯入 / refine 完成後遞增，讀取快取以此判斷是否過期；
+# catalog_id 在節點第一次建立時產生，資料庫清空重建後 generation 從頭計算也不會用到舊的快取
+GENERATION_CYPHER = """
+    MERGE (g:ImportGeneration {name: 'catalog'})
+    SET g.value = coalesce(g.value, 0), g.catalog_id = coalesce(g.catalog_id, randomUUID())
+    RETURN g.value AS value, g.catalog_id AS catalog_id
+"""
+
+BUMP_GENERATION_CYPHER = """
+    MERGE (g:ImportGeneration {name: 'catalog'})
+    SET g.value = coalesce(g.value, 0) + 1, g.catalog_id = coalesce(g.catalog_id, randomUUID())
+    RETURN g.value AS value, g.catalog_id AS catalog_id
+"""
+
+_driver = None
+_driver_lock = threading.Lock()
+
+def get_driver():
+    """每個 process 共用一個 driver (本身就是連線池)，由 close_repositories() 在結束時關閉"""
+    global _driver
+    with _driver_lock:
+        if _driver is None:
+            _driver = GraphDatabase.driver(config.NEO4J_URI, auth=(config.NEO4J_USER, config.NEO4J_PASSWORD),
+                                           max_connection_pool_size=config.NEO4J_POOL_SIZE)
+        return _driver
+
+def close_driver():
+    global _driver
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+
+class QueryCache:
+    """
+    讀取查詢結果的快取 (SQLite + process 內的 dict)，
+    scope 識別資料來自哪一個資料庫 (backend、位置與 catalog id)，
+    key 含 import generation，匯入後 generation 改變，舊結果自動失效並在下次寫入時清除
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        # 舊版的 query_cache 沒有區分資料庫，直接捨棄
+        self.conn.execute("DROP TABLE IF EXISTS query_cache")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_results (
+                scope TEXT NOT NULL,
+                generation INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (scope, generation, key)
+            )
+        """)
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.conn.close()
+
+    def get_or_load(self, scope, generation, key, load):
+        memo_key = (scope, generation, key)
+        if memo_key in self.memory:
+            self.hits += 1
+            return self.memory[memo_key]
+
+        row = self.conn.execute("SELECT value FROM query_results WHERE scope = ? AND generation = ? AND key = ?",
+                                (scope, generation, key)).fetchone()
+        if row:
+            self.hits += 1
+            value = json.loads(row[0])
+        else:
+            self.misses += 1
+            value = load()
+            with self.conn:
+                self.conn.execute("DELETE FROM query_results WHERE scope = ? AND generation <> ?",
+                                  (scope, generation))
+                self.conn.execute("INSERT OR REPLACE INTO query_results VALUES (?, ?, ?, ?)",
+                                  (scope, generation, key, json.dumps(value, ensure_ascii=False)))
+        self.memory[memo_key] = value
+        return value
+
+class CatalogRepository:
+    """
+    目錄查詢的共用入口：Neo4j 透過 get_driver() 的共用 driver，或本地 SQLite (config.CATALOG_BACKEND)，
+    讀取結果依 import generation 快取，同一次執行或之後的執行在資料未變動時都不需要再查詢資料庫。
+
+    快取開啟時 (config.QUERY_CACHE)，不經過 bump_generation() 的寫入 (例如以 cypher.cmd 手動修改)
+    不會被讀到；手動修改後要遞增 generation，或以 JMANGA_QUERY_CACHE=0 停用快取
+    """
+
+    def __init__(self, backend=None, cache_path=None, use_cache=None):
+        self.sqlite = SqliteCatalog() if config.use_sqlite(backend) else None
+        self.backend = "sqlite" if self.sqlite else "neo4j"
+        use_cache = config.QUERY_CACHE if use_cache is None else use_cache
+        self.cache = QueryCache(Path(cache_path or config.QUERY_CACHE_PATH)) if use_cache else None
+        self._generation = None
+        self._catalog_id = None
+
+    def close(self):
+        if self.sqlite:
+            self.sqlite.close()
+        if self.cache:
+            self.cache.close()
+
+    def session(self):
+        return get_driver().session()
+
+    def read(self, cypher, **params):
+        with self.session() as session:
+            return [record.data() for record in session.run(cypher, **params)]
+
+    def generation(self):
+        if self._generation is None:
+            if self.sqlite:
+                self._generation = self.sqlite.generation()
+                self._catalog_id = self.sqlite.catalog_id()
+            else:
+                record = self.read(GENERATION_CYPHER)[0]
+                self._generation, self._catalog_id = record["value"], record["catalog_id"]
+        return self._generation
+
+    def bump_generation(self):
+        """資料有寫入時由 db_import / db_refine 呼叫，讓所有快取的讀取結果失效"""
+        if self.sqlite:
+            self._generation = self.sqlite.bump_generation()
+            self._catalog_id = self.sqlite.catalog_id()
+        else:
+            record = self.read(BUMP_GENERATION_CYPHER)[0]
+            self._generation, self._catalog_id = record["value"], record["catalog_id"]
+        return self._generation
+
+    def scope(self):
+        """快取的資料庫識別：backend、SQLite 檔的絕對路徑或 Neo4j URI，以及資料庫內的 catalog id"""
+        generation = self.generation()
+        location = str(self.sqlite.path.resolve()) if self.sqlite else config.NEO4J_URI
+        return generation, f"{self.backend}:{location}:{self._catalog_id}"
+
+    def cached(self, name, params, load):
+        if self.cache is None:
+            return load()
+        key = json.dumps([name, params], ensure_ascii=False, sort_keys=True)
+        generation, scope = self.scope()
+        return self.cache.get_or_load(scope, generation, key, load)
+
+    def get_genre_counts(self):
+        """[(genre, manga_count)]，由多到少排序"""
+        if self.sqlite:
+            load = lambda: [list(row) for row in self.sqlite.get_genre_counts()]
+        else:
+            load = lambda: [[r["genre"], r["manga_count"]] for r in self.read(GENRE_COUNTS_CYPHER)]
+        return [tuple(row) for row in self.cached("genre_counts", None, load)]
+
+    def get_manga_by_genres(self, genre_names):
+        """任一 genre 符合的漫畫 (OR)，依章節數排序"""
+        genre_names = list(genre_names)
+        if self.sqlite:
+            load = lambda: self.sqlite.get_manga_by_genres(genre_names)
+        elif len(genre_names) == 1:
+            # 如果只有一個 genre，使用原來的查詢
+            load = lambda: self.read(MANGA_BY_GENRE_CYPHER, genre_name=genre_names[0])
+        else:
+            load = lambda: self.read(MANGA_BY_GENRES_CYPHER, genre_names=genre_names)
+        return self.cached("manga_by_genres", genre_names, load)
+
+    def get_manga_without_major_genres(self, major_genres):
+        major_genres = sorted(major_genres)
+        if self.sqlite:
+            load = lambda: list(self.sqlite.get_manga_without_major_genres(major_genres))
+        else:
+            load = lambda: self.read(WITHOUT_MAJOR_GENRES_CYPHER, major_genres=major_genres)
+        return self.cached("without_major_genres", major_genres, load)
+
+    def get_all_manga(self):
+        """有 genre 的所有漫畫，供 CatalogSnapshot 使用"""
+        if self.sqlite:
+            load = lambda: list(self.sqlite.get_all_manga())
+        else:
+            load = lambda: self.read(ALL_MANGA_CYPHER)
+        return self.cached("all_manga", None, load)
+
+    def get_manga_without_genres(self):
+        """已匯入但沒有 genre 的漫畫 (get_all_manga 與快照不包含它們)"""
+        if self.sqlite:
+            load = lambda: list(self.sqlite.get_manga_without_genres())
+        else:
+            load = lambda: self.read(WITHOUT_GENRES_CYPHER)
+        return self.cached("without_genres", None, load)
+
+    def get_genre_names(self):
+        """不快取，供 db_refine 在寫入前取得最新的 Genre 名稱"""
+        if self.sqlite:
+            return self.sqlite.get_genre_names()
+        return [r["name"] for r in self.read("MATCH (g:Genre) RETURN g.name AS name")]
+
+_repositories = {}
+
+def get_repository(backend=None):
+    """
+    同一個 process 內共用的 CatalogRepository (每個 backend 一個)，
+    GenreCounter / MangaQuery / GenreChecker / GenreRefiner 都透過它查詢，本身不持有連線
+    """
+    backend = "sqlite" if config.use_sqlite(backend) else "neo4j"
+    with _driver_lock:
+        if backend not in _repositories:
+            _repositories[backend] = CatalogRepository(backend)
+        return _repositories[backend]
+
+def close_repositories():
+    """關閉共用的 repository (SQLite 連線、讀取快取) 與 Neo4j driver；process 結束時自動執行"""
+    with _driver_lock:
+        repositories = list(_repositories.values())
+        _repositories.clear()
+    for repository in repositories:
+        repository.close()
+    close_driver()
+
+atexit.register(close_repositories)
@@ -0,0 +1,204 @@
+from pathlib import Path
+import json
+import random
+import sqlite3
+
+import config
+
+# 與 Neo4j 相同的資料模型：
+#   (:Manga)-[:HAS_GENRE]->(:Genre)   -> manga / genre / has_genre
+#   (:Manga)-[:RELATED_TO]->(:Manga)  -> related_to
+# related manga 尚未匯入時與 Neo4j 一樣建立只有 url / title 的 manga 列
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS manga (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    name TEXT,
+    title TEXT,
+    chapters INTEGER,
+    image TEXT,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS manga_chapters ON manga (chapters DESC);
+
+CREATE TABLE IF NOT EXISTS genre (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS has_genre (
+    manga_id INTEGER NOT NULL REFERENCES manga (id),
+    genre_id INTEGER NOT NULL REFERENCES genre (id),
+    PRIMARY KEY (manga_id, genre_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS has_genre_genre ON has_genre (genre_id, manga_id);
+
+CREATE TABLE IF NOT EXISTS related_to (
+    manga_id INTEGER NOT NULL REFERENCES manga (id),
+    related_id INTEGER NOT NULL REFERENCES manga (id),
+    PRIMARY KEY (manga_id, related_id)
+) WITHOUT ROWID;
+
+-- import generation、catalog id 等設定值
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+# 每部漫畫的 genres 以 JSON 陣列回傳，對應 Cypher 的 collect(DISTINCT g.name)
+MANGA_COLUMNS = """
+    m.name AS name,
+    m.title AS title,
+    m.chapters AS chapters,
+    m.image AS image,
+    m.url AS url,
+    (SELECT json_group_array(g.name)
+       FROM has_genre h JOIN genre g ON g.id = h.genre_id
+      WHERE h.manga_id = m.id) AS genres
+"""
+
+class SqliteCatalog:
+    """
+    本地 SQLite 版的漫畫目錄，提供與 Neo4j 查詢相同的方法，
+    讓報表與頁面產生不需要連線到遠端資料庫
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or config.SQLITE_PATH)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # 每個資料庫檔一個隨機 id，重建 catalog.db 後 generation 從頭計算也不會用到舊的查詢快取
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('catalog_id', ?)",
+                              (random.getrandbits(62),))
+
+    def close(self):
+        self.conn.close()
+
+    def rows(self, sql, params=()):
+        cursor = self.conn.execute(sql, params)
+        columns = [c[0] for c in cursor.description]
+        for values in cursor:
+            row = dict(zip(columns, values))
+            if "genres" in row:
+                row["genres"] = json.loads(row["genres"])
+            yield row
+
+    # ---- 查詢 (對應 GenreCounter / MangaQuery / GenreChecker / CatalogSnapshot) ----
+
+    def get_genre_counts(self):
+        return self.conn.execute("""
+            SELECT g.name AS genre, count(*) AS manga_count
+              FROM has_genre h JOIN genre g ON g.id = h.genre_id
+             GROUP BY g.id
+             ORDER BY manga_count DESC
+        """).fetchall()
+
+    def get_manga_by_genres(self, genre_names):
+        """任一 genre 符合的漫畫 (OR)，依章節數排序"""
+        placeholders = ", ".join("?" * len(genre_names))
+        return list(self.rows(f"""
+            SELECT {MANGA_COLUMNS}
+              FROM manga m
+             WHERE m.id IN (SELECT h.manga_id
+                              FROM has_genre h JOIN genre g ON g.id = h.genre_id
+                             WHERE g.name IN ({placeholders}))
+             ORDER BY m.chapters IS NULL DESC, m.chapters DESC
+        """, list(genre_names)))
+
+    def get_manga_without_major_genres(self, major_genres):
+        """沒有任何 major genre 的漫畫 (逐筆產生)，欄位與 GenreChecker 的 Cypher 相同"""
+        placeholders = ", ".join("?" * len(major_genres))
+        for row in self.rows(f"""
+            SELECT {MANGA_COLUMNS}
+              FROM manga m
+             WHERE NOT EXISTS (SELECT 1
+                                 FROM has_genre h JOIN genre g ON g.id = h.genre_id
+                                WHERE h.manga_id = m.id AND g.name IN ({placeholders}))
+             ORDER BY m.chapters IS NULL DESC, m.chapters DESC
+        """, list(major_genres)):
+            row["manga_name"] = row.pop("name")
+            yield row
+
+    def get_all_manga(self):
+        """有 genre 的漫畫，對應 CatalogRepository.get_all_manga 的 Cypher"""
+        return self.rows(f"""
+            SELECT {MANGA_COLUMNS}
+              FROM manga m
+             WHERE EXISTS (SELECT 1 FROM has_genre h WHERE h.manga_id = m.id)
+        """)
+
+    def get_manga_without_genres(self):
+        """已匯入但沒有 genre 的漫畫，related manga 的 stub (只有 url / title) 不算"""
+        return self.rows(f"""
+            SELECT {MANGA_COLUMNS}
+              FROM manga m
+             WHERE NOT EXISTS (SELECT 1 FROM has_genre h WHERE h.manga_id = m.id)
+               AND (m.chapters IS NOT NULL OR m.image IS NOT NULL)
+             ORDER BY m.chapters IS NULL DESC, m.chapters DESC
+        """)
+
+    def get_genre_names(self):
+        return [name for (name,) in self.conn.execute("SELECT name FROM genre")]
+
+    def generation(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'import_generation'").fetchone()
+        return row[0] if row else 0
+
+    def catalog_id(self):
+        return self.conn.execute("SELECT value FROM meta WHERE key = 'catalog_id'").fetchone()[0]
+
+    def bump_generation(self):
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO meta (key, value) VALUES ('import_generation', 1)
+                ON CONFLICT (key) DO UPDATE SET value = value + 1
+            """)
+        return self.generation()
+
+    # ---- 寫入 (db_import --backend sqlite) ----
+
+    def get_content_hashes(self, urls):
+        result = {}
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            result.update(self.conn.execute(
+                f"SELECT url, content_hash FROM manga WHERE url IN ({', '.join('?' * len(chunk))})", chunk))
+        return result
+
+    def manga_id(self, url, title=None):
+        self.conn.execute("INSERT OR IGNORE INTO manga (url, title) VALUES (?, ?)", (url, title))
+        return self.conn.execute("SELECT id FROM manga WHERE url = ?", (url,)).fetchone()[0]
+
+    def genre_id(self, name):
+        self.conn.execute("INSERT OR IGNORE INTO genre (name) VALUES (?)", (name,))
+        return self.conn.execute("SELECT id FROM genre WHERE name = ?", (name,)).fetchone()[0]
+
+    def sync_rows(self, rows):
+        """
+        與 db_import.SYNC_CYPHER 相同：覆寫屬性並以新資料取代 genre / related manga 關係
+        (short_title 為空時保留原本的 name)，一批在同一個交易內完成
+        """
+        with self.conn:
+            for row in rows:
+                manga_id = self.manga_id(row["url"])
+                self.conn.execute("""
+                    UPDATE manga
+                       SET name = CASE WHEN ? <> '' THEN ? ELSE coalesce(name, '') END,
+                           title = ?, chapters = CAST(? AS INTEGER), image = ?, content_hash = ?
+                     WHERE id = ?
+                """, (row["short_title"], row["short_title"], row["title"], row["chapter_count"],
+                      row["image"], row.get("content_hash"), manga_id))
+
+                self.conn.execute("DELETE FROM has_genre WHERE manga_id = ?", (manga_id,))
+                self.conn.executemany("INSERT OR IGNORE INTO has_genre VALUES (?, ?)",
+                                      [(manga_id, self.genre_id(genre)) for genre in row["genres"]])
+
+                self.conn.execute("DELETE FROM related_to WHERE manga_id = ?", (manga_id,))
+                self.conn.executemany("INSERT OR IGNORE INTO related_to VALUES (?, ?)",
+                                      [(manga_id, self.manga_id(related["url"], related.get("title")))
+                                       for related in row["related_manga"]])
+        return len(rows)
@@ -1,3 +1,6 @@
+// 卡片圖片的顯示寬度，對應 style.css 的 grid 設定
+const THUMB_SIZES = '(max-width: 600px) 150px, 300px';
+
 // Intersection Observer for lazy loading
 const observer = new IntersectionObserver((entries) => {
     entries.forEach(entry => {
@@ -6,10 +9,25 @@ const observer = new IntersectionObserver((entries) => {
             const imgUrl = loadingDiv.dataset.img;
             
             const img = new Image();
+            // 有本地縮圖時使用 srcset (AVIF 透過 <picture> 提供，瀏覽器不支援時退回 WebP)
+            let element = img;
+            if (loadingDiv.dataset.avifSrcset) {
+                element = document.createElement('picture');
+                const source = document.createElement('source');
+                source.type = 'image/avif';
+                source.srcset = loadingDiv.dataset.avifSrcset;
+                source.sizes = THUMB_SIZES;
+                element.appendChild(source);
+                element.appendChild(img);
+            }
+            if (loadingDiv.dataset.srcset) {
+                img.srcset = loadingDiv.dataset.srcset;
+                img.sizes = THUMB_SIZES;
+            }
             img.src = imgUrl;
             img.alt = "Manga Cover";
             img.onload = () => {
-                loadingDiv.parentNode.replaceChild(img, loadingDiv);
+                loadingDiv.parentNode.replaceChild(element, loadingDiv);
             };
             img.onerror = () => {
                 loadingDiv.textContent = 'Failed to load image';
@@ -89,3 +107,119 @@ window.addEventListener('load', updateWidth);
 
 // 視窗大小改變時更新寬度
 window.addEventListener('resize', updateWidth);
+
+// 標題搜尋：使用 html_index 產生的 search/ 2-gram 索引，只載入查詢需要的 shard
+const searchBox = document.getElementById('search-box');
+
+if (searchBox) {
+    const searchStatus = document.getElementById('search-status');
+    const searchResults = document.getElementById('search-results');
+    const MAX_RESULTS = 60;
+    const shardCache = new Map();
+    let searchMeta = null;
+    let searchTimer = null;
+    let searchSeq = 0;
+
+    // 必須與 search_index.normalize_text 一致
+    const normalizeText = text => (text || '').normalize('NFKC').toLowerCase().replace(/\s+/g, '');
+
+    const bigrams = text => {
+        const chars = Array.from(text);
+        const grams = new Set();
+        for (let i = 0; i < chars.length - 1; i++) {
+            grams.add(chars[i] + chars[i + 1]);
+        }
+        return grams;
+    };
+
+    // 必須與 search_index.gram_shard 一致 (FNV-1a over code points)
+    const gramShard = (gram, shards) => {
+        let h = 0x811c9dc5;
+        for (const ch of gram) {
+            h ^= ch.codePointAt(0);
+            h = Math.imul(h, 0x01000193) >>> 0;
+        }
+        return h % shards;
+    };
+
+    const loadJson = path => {
+        if (!shardCache.has(path)) {
+            shardCache.set(path, fetch(path).then(response => response.json()));
+        }
+        return shardCache.get(path);
+    };
+
+    const renderResult = ([title, shortTitle, url, chapters, genres]) => {
+        const card = document.createElement('div');
+        card.className = 'manga-card';
+        const titleDiv = document.createElement('div');
+        titleDiv.className = 'manga-title';
+        const link = document.createElement('a');
+        link.href = url;
+        link.target = 'mypage';
+        link.textContent = shortTitle ? `${title} (${shortTitle})` : title;
+        titleDiv.appendChild(link);
+        const info = document.createElement('div');
+        info.className = 'manga-info';
+        info.textContent = `Chapters: ${chapters}`;
+        const genresDiv = document.createElement('div');
+        genresDiv.className = 'genres';
+        genres.forEach(genre => {
+            const span = document.createElement('span');
+            span.textContent = genre;
+            genresDiv.appendChild(span);
+        });
+        card.append(titleDiv, info, genresDiv);
+        return card;
+    };
+
+    const search = async query => {
+        const seq = ++searchSeq;
+        const normalized = normalizeText(query);
+        searchResults.replaceChildren();
+        if (Array.from(normalized).length < 2) {
+            searchStatus.textContent = normalized ? 'Type at least 2 characters' : '';
+            return;
+        }
+
+        searchMeta = searchMeta || await loadJson('search/meta.json');
+        const grams = [...bigrams(normalized)];
+        const postings = await Promise.all(grams.map(async gram => {
+            const shard = await loadJson(`search/index/${gramShard(gram, searchMeta.index_shards)}.json`);
+            return shard[gram] || [];
+        }));
+
+        // 交集所有 gram 的 posting list (由最短的開始)
+        postings.sort((a, b) => a.length - b.length);
+        let candidates = postings[0];
+        for (const list of postings.slice(1)) {
+            const set = new Set(list);
+            candidates = candidates.filter(id => set.has(id));
+        }
+
+        // 2-gram 可能跨位置誤判，載入文件後確認確實包含查詢字串
+        const results = [];
+        for (const id of candidates) {
+            if (results.length >= MAX_RESULTS) {
+                break;
+            }
+            const docs = await loadJson(`search/docs/${Math.floor(id / searchMeta.doc_shard_size)}.json`);
+            const doc = docs[id % searchMeta.doc_shard_size];
+            const [title, shortTitle, , , genres] = doc;
+            if ([title, shortTitle, ...genres].some(field => normalizeText(field).includes(normalized))) {
+                results.push(doc);
+            }
+        }
+        if (seq !== searchSeq) {
+            return;  // 已有更新的查詢
+        }
+
+        searchStatus.textContent = `${results.length}${results.length >= MAX_RESULTS ? '+' : ''} results`;
+        searchResults.replaceChildren(...results.map(renderResult));
+    };
+
+    searchBox.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => search(searchBox.value), 200);
+    });
+}
@@ -0,0 +1,176 @@
+// Virtual scrolling grid for sharded genre pages
+// 只渲染可見範圍 (加上前後緩衝) 的卡片，資料以 JSON shard 依需要載入
+(function () {
+    const grid = document.getElementById('virtual-grid');
+    if (!grid) {
+        return;
+    }
+
+    const base = grid.dataset.base;
+    const total = parseInt(grid.dataset.total, 10);
+    const shardSize = parseInt(grid.dataset.shardSize, 10);
+    const BUFFER_ROWS = 3;
+    const MIN_CARD_WIDTH = 200;
+    const MIN_CARD_WIDTH_MOBILE = 150;
+    const THUMB_SIZES = '(max-width: 600px) 150px, 300px';
+
+    const RETRY_BASE_MS = 2000;
+    const RETRY_MAX_MS = 60000;
+
+    // shard index -> rows、載入中的 Promise，或載入失敗的 {failed, attempts, retryAt}
+    const shards = new Map();
+    const windowEl = document.createElement('div');
+    windowEl.className = 'virtual-window';
+    grid.appendChild(windowEl);
+
+    let columns = 1;
+    let rowHeight = 1;
+    let renderedRange = '';
+    let scheduled = false;
+
+    function loadShard(index) {
+        const previous = shards.get(index);
+        // 失敗過的 shard 以指數退避重試，不會每次捲動都重新請求
+        if (previous === undefined || (previous.failed && Date.now() >= previous.retryAt)) {
+            const attempts = previous ? previous.attempts : 0;
+            const request = fetch(`${base}${index}.json`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(rows => {
+                    shards.set(index, rows);
+                })
+                .catch(() => {
+                    const delay = Math.min(RETRY_MAX_MS, RETRY_BASE_MS * 2 ** attempts);
+                    shards.set(index, { failed: true, attempts: attempts + 1, retryAt: Date.now() + delay });
+                })
+                .then(() => {
+                    renderedRange = '';  // 資料到了 (或失敗)，強制重新渲染
+                    scheduleRender();
+                });
+            shards.set(index, request);
+        }
+        return shards.get(index);
+    }
+
+    function createCard(row) {
+        const [title, url, image, chapters, genres, srcset, avifSrcset] = row;
+        const card = document.createElement('div');
+        card.className = 'manga-card';
+
+        const img = document.createElement('img');
+        if (srcset) {
+            // 本地 WebP 縮圖
+            img.srcset = srcset;
+            img.sizes = THUMB_SIZES;
+        }
+        img.src = image;
+        img.alt = 'Manga Cover';
+        img.loading = 'lazy';
+        if (avifSrcset) {
+            // 與 HTML 模式 (script.js) 相同：AVIF 透過 <picture> 提供，不支援時退回 WebP
+            const picture = document.createElement('picture');
+            const source = document.createElement('source');
+            source.type = 'image/avif';
+            source.srcset = avifSrcset;
+            source.sizes = THUMB_SIZES;
+            picture.appendChild(source);
+            picture.appendChild(img);
+            card.appendChild(picture);
+        } else {
+            card.appendChild(img);
+        }
+
+        const titleDiv = document.createElement('div');
+        titleDiv.className = 'manga-title';
+        const link = document.createElement('a');
+        link.href = url;
+        link.target = 'mypage';
+        link.textContent = title;
+        titleDiv.appendChild(link);
+        card.appendChild(titleDiv);
+
+        const info = document.createElement('div');
+        info.className = 'manga-info';
+        info.textContent = `Chapters: ${chapters}`;
+        card.appendChild(info);
+
+        const genresDiv = document.createElement('div');
+        genresDiv.className = 'genres';
+        genres.forEach(genre => {
+            const span = document.createElement('span');
+            span.textContent = genre;
+            genresDiv.appendChild(span);
+        });
+        card.appendChild(genresDiv);
+        return card;
+    }
+
+    function createPlaceholder(failed) {
+        const card = document.createElement('div');
+        card.className = 'manga-card';
+        const loading = document.createElement('div');
+        loading.className = 'loading';
+        loading.textContent = failed ? 'Failed to load' : 'Loading...';
+        card.appendChild(loading);
+        return card;
+    }
+
+    function layout() {
+        const style = getComputedStyle(grid);
+        const gap = parseFloat(getComputedStyle(windowEl).rowGap) || 0;
+        const cardHeight = parseFloat(style.getPropertyValue('--card-height')) || 400;
+        const minWidth = window.innerWidth <= 600 ? MIN_CARD_WIDTH_MOBILE : MIN_CARD_WIDTH;
+
+        columns = Math.max(1, Math.floor((grid.clientWidth + gap) / (minWidth + gap)));
+        rowHeight = cardHeight + gap;
+        windowEl.style.gridTemplateColumns = `repeat(${columns}, 1fr)`;
+        grid.style.height = `${Math.ceil(total / columns) * rowHeight}px`;
+        renderedRange = '';
+        render();
+    }
+
+    function render() {
+        scheduled = false;
+        const top = grid.getBoundingClientRect().top;
+        const rowCount = Math.ceil(total / columns);
+        const firstRow = Math.max(0, Math.floor(-top / rowHeight) - BUFFER_ROWS);
+        const lastRow = Math.min(rowCount - 1, Math.floor((window.innerHeight - top) / rowHeight) + BUFFER_ROWS);
+        const start = firstRow * columns;
+        const end = Math.min(total, (lastRow + 1) * columns);
+
+        const range = `${start}-${end}`;
+        if (range === renderedRange) {
+            return;
+        }
+        renderedRange = range;
+
+        const fragment = document.createDocumentFragment();
+        for (let i = start; i < end; i++) {
+            const shard = loadShard(Math.floor(i / shardSize));
+            fragment.appendChild(Array.isArray(shard) ? createCard(shard[i % shardSize])
+                                                      : createPlaceholder(shard && shard.failed));
+        }
+        // 預先載入下一個 shard
+        if (end < total) {
+            loadShard(Math.floor(end / shardSize));
+        }
+
+        windowEl.style.transform = `translateY(${firstRow * rowHeight}px)`;
+        windowEl.replaceChildren(fragment);
+    }
+
+    function scheduleRender() {
+        if (!scheduled) {
+            scheduled = true;
+            requestAnimationFrame(render);
+        }
+    }
+
+    window.addEventListener('scroll', scheduleRender, { passive: true });
+    window.addEventListener('resize', layout);
+    layout();
+})();
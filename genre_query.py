@@ -0,0 +1,176 @@
+from functools import lru_cache
+import hashlib
+import re
+
+# 查詢語法：
+#   異世界 AND 恋愛 NOT BL
+#   (ファンタジー OR 異世界) AND NOT ハーレム
+#   "名稱 含空白" 以雙引號包住
+# 優先順序 NOT > AND > OR；"A NOT B" 等同 "A AND NOT B"，關鍵字不分大小寫
+
+TOKEN_PATTERN = re.compile(r'"([^"]*)"|(\()|(\))|([^\s()"]+)')
+KEYWORDS = {"AND", "OR", "NOT"}
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    for match in TOKEN_PATTERN.finditer(expression):
+        if expression[position:match.start()].strip():
+            raise ValueError(f"Unexpected input at {position}: {expression[position:match.start()]!r}")
+        position = match.end()
+        quoted, open_paren, close_paren, word = match.groups()
+        if quoted is not None:
+            tokens.append(("GENRE", quoted))
+        elif open_paren:
+            tokens.append(("(", open_paren))
+        elif close_paren:
+            tokens.append((")", close_paren))
+        elif word.upper() in KEYWORDS:
+            tokens.append((word.upper(), word))
+        else:
+            tokens.append(("GENRE", word))
+    if expression[position:].strip():
+        raise ValueError(f"Unexpected input at {position}: {expression[position:]!r}")
+    return tokens
+
+class _Parser:
+    """遞迴下降解析，產生 ("genre", name) / ("not", x) / ("and", a, b) / ("or", a, b)"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self, kind):
+        if self.peek() != kind:
+            found = self.tokens[self.position][1] if self.position < len(self.tokens) else "end of query"
+            raise ValueError(f"Expected {kind}, found {found!r}")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token[1]
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected {self.tokens[self.position][1]!r}")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == "OR":
+            self.take("OR")
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek() in ("AND", "NOT"):
+            # "A NOT B" 視為 "A AND NOT B"
+            if self.peek() == "AND":
+                self.take("AND")
+            node = ("and", node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek() == "NOT":
+            self.take("NOT")
+            return ("not", self.parse_not())
+        if self.peek() == "(":
+            self.take("(")
+            node = self.parse_or()
+            self.take(")")
+            return node
+        return ("genre", self.take("GENRE"))
+
+@lru_cache(maxsize=256)
+def parse_query(expression):
+    """Parse a boolean genre expression into a tuple tree."""
+    return _Parser(tokenize(expression)).parse()
+
+def format_query(node, parent="or"):
+    """Canonical text of a parsed query, with only the parentheses it needs."""
+    kind = node[0]
+    if kind == "genre":
+        name = node[1]
+        return f'"{name}"' if re.search(r'[\s()"]', name) or name.upper() in KEYWORDS else name
+    if kind == "not":
+        return f"NOT {format_query(node[1], 'not')}"
+    text = f" {kind.upper()} ".join(format_query(child, kind) for child in node[1:])
+    # and 在 or 之內不需要括號，其他巢狀組合需要
+    if parent == "not" or (parent == "and" and kind == "or"):
+        return f"({text})"
+    return text
+
+def query_page_name(node):
+    """
+    File stem for a query page, e.g. q_異世界_AND_恋愛_AND_NOT_BL_1a2b3c4d
+
+    q_ 前綴避免與 genre 頁面 (docs/<genre>.html) 衝突；檔名去掉了括號，
+    所以加上正規化查詢的短 hash 區分分組不同的查詢
+    """
+    canonical = format_query(node)
+    text = re.sub(r"[\s/\\]+", "_", canonical.replace('"', "").replace("(", "").replace(")", ""))
+    digest = hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:8]
+    return f"q_{text}_{digest}"
+
+def query_genres(node):
+    """All genre names referenced by a parsed query."""
+    if node[0] == "genre":
+        return {node[1]}
+    return set().union(*(query_genres(child) for child in node[1:]))
+
+class GenreIndex:
+    """
+    CatalogSnapshot 上的 genre bitmap 索引
+
+    每個 genre 一個 Python int 作為 bitset (bit i = snapshot.manga[i])，
+    AND / OR / NOT 直接對整數做位元運算，不需要額外套件
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.size = len(snapshot.manga)
+        self.all_bits = (1 << self.size) - 1
+        self.bitmaps = {}
+        for genre, indices in snapshot.by_genre.items():
+            # 先填 bytearray 再一次轉成 int，避免每個 bit 都複製一次大整數
+            buffer = bytearray((self.size + 7) // 8)
+            for index in indices:
+                buffer[index >> 3] |= 1 << (index & 7)
+            self.bitmaps[genre] = int.from_bytes(buffer, "little")
+
+    def bitmap(self, genre):
+        try:
+            return self.bitmaps[genre]
+        except KeyError:
+            raise ValueError(f"Unknown genre: {genre}") from None
+
+    def evaluate(self, node):
+        kind = node[0]
+        if kind == "genre":
+            return self.bitmap(node[1])
+        if kind == "not":
+            return self.all_bits & ~self.evaluate(node[1])
+        if kind == "and":
+            return self.evaluate(node[1]) & self.evaluate(node[2])
+        return self.evaluate(node[1]) | self.evaluate(node[2])
+
+    def match(self, expression):
+        """Bitmap of the manga matching `expression` (a string or a parsed query)."""
+        node = parse_query(expression) if isinstance(expression, str) else expression
+        return self.evaluate(node)
+
+    def count(self, expression):
+        return bin(self.match(expression)).count("1")
+
+    def indices(self, bits):
+        # bin() 由最高位開始，反轉後第 i 個字元就是 bit i
+        digits = bin(bits)[:1:-1]
+        return [i for i, digit in enumerate(digits) if digit == "1"]
+
+    def query(self, expression):
+        """符合條件的漫畫，依章節數排序 (與 snapshot 順序相同)"""
+        manga = self.snapshot.manga
+        return [manga[i] for i in self.indices(self.match(expression))]
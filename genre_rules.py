@@ -0,0 +1,88 @@
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+# {name1}（{name2}） 或 {name1}({name2})，右括號可能缺少
+PARENTHESES_PATTERN = re.compile(r'^(.*?)[（(]([^（()）]*)[）)]?\s*$')
+
+class GenreNormalizer:
+    """
+    將 genre_rules.json 的 merge / split / 分隔字元規則編譯成單一查詢表，
+    在爬取或匯入時一次處理，取代匯入後對整個圖做的 merge_genre / split_genre
+
+    查詢順序:
+      1. 查詢表中有完全相同的名稱時直接使用 (例如 "料理･グルメ" -> 料理)
+      2. 含括號時拆成括號外與括號內兩部分
+      3. 含分隔字元 (・ ･) 時拆開
+    拆開後的各部分再遞迴套用相同規則。
+    """
+
+    def __init__(self, rules: dict):
+        self.split_chars = rules.get("split_chars", [])
+        self.split_parentheses = rules.get("split_parentheses", False)
+        self.split_pattern = re.compile("|".join(map(re.escape, self.split_chars))) if self.split_chars else None
+        self.table = self.compile(rules)
+        self.cache: Dict[str, Tuple[str, ...]] = {}
+
+    @classmethod
+    def from_file(cls, path="genre_rules.json"):
+        with open(Path(path), "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def compile(rules: dict) -> Dict[str, Tuple[str, ...]]:
+        """Flatten merge and split rules into name -> final names, following chained rules."""
+        direct: Dict[str, List[str]] = {}
+        for target, alternatives in rules.get("merge", {}).items():
+            for alternative in alternatives:
+                direct[alternative] = [target]
+        for source, new_genres in rules.get("split", {}).items():
+            direct[source] = list(new_genres)
+
+        def resolve(name, seen):
+            if name not in direct or name in seen:
+                return [name]
+            resolved = []
+            for new_name in direct[name]:
+                for final in resolve(new_name, seen | {name}):
+                    if final not in resolved:
+                        resolved.append(final)
+            return resolved
+
+        return {name: tuple(resolve(name, frozenset())) for name in direct}
+
+    def normalize(self, genre: str) -> Tuple[str, ...]:
+        genre = genre.strip()
+        if genre in self.cache:
+            return self.cache[genre]
+
+        if not genre:
+            result = ()
+        elif genre in self.table:
+            result = self.table[genre]
+        else:
+            parts = None
+            match = self.split_parentheses and PARENTHESES_PATTERN.match(genre)
+            if match:
+                parts = [match.group(1), match.group(2)]
+            elif self.split_pattern and self.split_pattern.search(genre):
+                parts = self.split_pattern.split(genre)
+            result = self.normalize_genres(parts) if parts else (genre,)
+
+        self.cache[genre] = result
+        return result
+
+    def normalize_genres(self, genres: Iterable[str]) -> Tuple[str, ...]:
+        """Normalize a genre list, keeping first-seen order without duplicates."""
+        result = []
+        for genre in genres or []:
+            for name in self.normalize(genre):
+                if name not in result:
+                    result.append(name)
+        return tuple(result)
+
+    def apply(self, manga: dict) -> dict:
+        manga["genres"] = list(self.normalize_genres(manga.get("genres")))
+        return manga
+
@@ -0,0 +1,110 @@
+from pathlib import Path
+import gzip
+import hashlib
+import re
+
+try:
+    import brotli
+except ImportError:  # brotli 是選用套件，沒有安裝時只產生 .gz
+    brotli = None
+
+# 需要加上內容 hash 的靜態資源 (docs/ 中手動維護的原始檔)
+ASSETS = ["style.css", "script.js", "virtual-grid.js"]
+
+COMPRESS_SUFFIXES = {".html", ".css", ".js", ".json"}
+COMPRESSED_EXTENSIONS = (".gz", ".br")
+MIN_COMPRESS_SIZE = 256
+
+def drop_compressed(path):
+    """
+    刪除 path 的 .gz / .br；頁面或資料重新寫入時呼叫，
+    沒有使用 --optimize 的建置才不會留下內容過期的預先壓縮檔
+    """
+    path = Path(path)
+    for extension in COMPRESSED_EXTENSIONS:
+        path.with_name(path.name + extension).unlink(missing_ok=True)
+
+def fingerprint_assets(docs_dir):
+    """
+    複製 style.css 等為 style.<hash>.css，並刪除舊 hash 的複本
+
+    Returns:
+        {原始檔名: 加上 hash 的檔名}
+    """
+    mapping = {}
+    for name in ASSETS:
+        source = docs_dir / name
+        if not source.exists():
+            continue
+        data = source.read_bytes()
+        stem, suffix = name.rsplit(".", 1)
+        fingerprinted = f"{stem}.{hashlib.sha256(data).hexdigest()[:8]}.{suffix}"
+        for old in docs_dir.glob(f"{stem}.*.{suffix}"):
+            if old.name != fingerprinted and re.fullmatch(rf"{re.escape(stem)}\.[0-9a-f]{{8}}\.{suffix}", old.name):
+                old.unlink()
+        target = docs_dir / fingerprinted
+        if not target.exists():
+            target.write_bytes(data)
+        mapping[name] = fingerprinted
+    return mapping
+
+def asset_pattern(name):
+    """Match a reference to `name`, plain or previously fingerprinted."""
+    stem, suffix = name.rsplit(".", 1)
+    return re.compile(rf'(?<=["\'/]){re.escape(stem)}(?:\.[0-9a-f]{{8}})?\.{suffix}(?=["\'?#])')
+
+def minify_html(text):
+    """移除註解與標籤之間的空白，連續空白縮成一個"""
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.S)
+    text = re.sub(r">\s+<", "><", text)
+    text = re.sub(r"\s{2,}", " ", text)
+    return text.strip()
+
+def write_if_changed(path, data):
+    if path.exists() and path.read_bytes() == data:
+        return False
+    path.write_bytes(data)
+    return True
+
+def precompress(path):
+    """產生 .gz (以及安裝 brotli 時的 .br)；內容沒變的檔案不重新壓縮"""
+    written = 0
+    data = None
+    variants = [(COMPRESSED_EXTENSIONS[0], lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((COMPRESSED_EXTENSIONS[1], lambda d: brotli.compress(d, quality=11)))
+    for extension, compress in variants:
+        target = path.with_name(path.name + extension)
+        if target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+            continue
+        if data is None:
+            data = path.read_bytes()
+        written += write_if_changed(target, compress(data))
+    return written
+
+def optimize_site(docs_dir=Path("docs")):
+    """
+    1. 靜態資源加上內容 hash，讓 host 可以設定長時間快取
+    2. 所有 HTML 改用加上 hash 的檔名並壓縮空白
+    3. 為 HTML / CSS / JS / JSON 產生預先壓縮的 .gz / .br
+    """
+    docs_dir = Path(docs_dir)
+    mapping = fingerprint_assets(docs_dir)
+    patterns = [(asset_pattern(name), fingerprinted) for name, fingerprinted in mapping.items()]
+
+    pages_rewritten = 0
+    for page in docs_dir.glob("*.html"):
+        text = page.read_text(encoding="utf-8")
+        for pattern, fingerprinted in patterns:
+            text = pattern.sub(fingerprinted, text)
+        pages_rewritten += write_if_changed(page, minify_html(text).encode("utf-8"))
+
+    compressed = 0
+    for path in docs_dir.rglob("*"):
+        if path.suffix in COMPRESS_SUFFIXES and path.is_file() and path.stat().st_size >= MIN_COMPRESS_SIZE:
+            compressed += precompress(path)
+
+    print(f"Fingerprinted assets: {', '.join(mapping.values())}")
+    print(f"Pages rewritten: {pages_rewritten}, compressed files written: {compressed}"
+          f"{'' if brotli else ' (brotli not installed, gzip only)'}")
+    return mapping
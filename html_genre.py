@@ -1,125 +1,57 @@
-from neo4j import GraphDatabase
-from pathlib import Path
-import html
-import sys
+from db_repository import get_repository
+from html_render import render_genre_page
+from catalog_snapshot import CatalogSnapshot
+from genre_query import GenreIndex, format_query, parse_query, query_page_name
+import argparse
+import time
 
 class MangaQuery:
-    def __init__(self, uri="bolt://solarsuna.com:37687", user="neo4j", password="jack1234"):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
-
-    def close(self):
-        self.driver.close()
+    def __init__(self, repository=None, backend=None):
+        self.repository = repository or get_repository(backend)
 
     def get_manga_by_genres(self, genre_names):
-        with self.driver.session() as session:
-            # 如果只有一個 genre，使用原來的查詢
-            if len(genre_names) == 1:
-                result = session.run("""
-                    MATCH (m:Manga)-[:HAS_GENRE]->(g:Genre {name: $genre_name})
-                    OPTIONAL MATCH (m)-[:HAS_GENRE]->(og:Genre)
-                    WITH m, 
-                         collect(DISTINCT og.name) as genres
-                    RETURN m.name as name,
-                           m.title as title,
-                           m.chapters as chapters,
-                           m.image as image,
-                           m.url as url,
-                           genres
-                    ORDER BY m.chapters DESC
-                """, genre_name=genre_names[0])
-            else:
-                # 如果有兩個 genre，使用 OR 條件
-                result = session.run("""
-                    MATCH (m:Manga)-[:HAS_GENRE]->(g:Genre)
-                    WHERE g.name IN $genre_names
-                    OPTIONAL MATCH (m)-[:HAS_GENRE]->(og:Genre)
-                    WITH m, 
-                         collect(DISTINCT og.name) as genres
-                    RETURN m.name as name,
-                           m.title as title,
-                           m.chapters as chapters,
-                           m.image as image,
-                           m.url as url,
-                           genres
-                    ORDER BY m.chapters DESC
-                """, genre_names=genre_names)
-            
-            return list(result)
+        return self.repository.get_manga_by_genres(genre_names)
 
     def generate_html(self, genre_names):
         manga_list = self.get_manga_by_genres(genre_names)
-        
-        # 生成標題
-        title = " or ".join(genre_names)
-        
-        html_content = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Manga List - {html.escape(title)}</title>
-    <link rel="stylesheet" href="style.css">
-</head>
-<body>
-    <h1>Manga List - {html.escape(title)}</h1>
-    <div class="manga-grid">
-"""
-
-        for manga in manga_list:
-            genres_html = "".join(f'<span>{html.escape(g)}</span>' for g in manga["genres"])
-            
-            html_content += f"""
-        <div class="manga-card">
-            <div class="loading" data-img="{html.escape(manga['image'])}">Loading...</div>
-            <div class="manga-title">
-                <a href="{html.escape(manga['url'])}" target="mypage">{html.escape(manga['title'])}</a>
-            </div>
-            <div class="manga-info">
-                Chapters: {manga['chapters'] or 0}
-            </div>
-            <div class="genres">
-                {genres_html}
-            </div>
-        </div>
-"""
-
-        html_content += """
-    </div>
-    <button id="scroll-top">↑ Top</button>
-    <script src="script.js"></script>
-</body>
-</html>
-"""
-
-        # 生成文件名
-        filename = "_".join(genre_names) + ".html"
-        
-        # Save HTML file
-        output_dir = Path("docs")
-        output_dir.mkdir(exist_ok=True)
-        output_path = output_dir / filename
-        output_path.write_text(html_content, encoding="utf-8")
-        return output_path
+        return generate_html(genre_names, manga_list)
+
+def generate_html(genre_names, manga_list):
+    """Render a genre page from already fetched manga rows."""
+    return render_genre_page(genre_names, manga_list)
+
+def generate_query_html(expression, snapshot):
+    """Render a page for a boolean genre expression, e.g. '異世界 AND 恋愛 NOT BL'."""
+    node = parse_query(expression)
+    index = GenreIndex(snapshot)
+    start = time.perf_counter()
+    bits = index.match(node)
+    elapsed = time.perf_counter() - start
+    manga_list = index.query(node)
+    print(f"Query {format_query(node)}: {len(manga_list)} manga ({elapsed * 1e6:.0f} µs)")
+    return render_genre_page([format_query(node)], manga_list, name=query_page_name(node)) if bits else None
 
 def main():
-    query = MangaQuery()
-    try:
-        # 從命令行參數獲取 genres
-        if len(sys.argv) > 2:
-            # 如果有兩個參數
-            genre_names = [sys.argv[1], sys.argv[2]]
-        elif len(sys.argv) > 1:
-            # 如果只有一個參數
-            genre_names = [sys.argv[1]]
-        else:
-            # 默認值
-            genre_names = ["異世界"]
-        
-        output_path = query.generate_html(genre_names)
-        print(f"HTML file generated: {output_path}")
-    finally:
-        query.close()
+    parser = argparse.ArgumentParser(description="Generate a manga page for one or more genres")
+    parser.add_argument("genres", nargs="*", help="one or two genres (OR), queried from Neo4j")
+    parser.add_argument("-q", "--query", help="boolean expression such as '異世界 AND 恋愛 NOT BL'")
+    parser.add_argument("--snapshot", help="catalog snapshot (JSON Lines) used by --query instead of Neo4j")
+    args = parser.parse_args()
+
+    if args.query:
+        snapshot = CatalogSnapshot.load(args.snapshot) if args.snapshot else CatalogSnapshot.from_backend()
+        try:
+            output_path = generate_query_html(args.query, snapshot)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"HTML file generated: {output_path}" if output_path else "No manga matched, nothing generated")
+        return
+
+    # 從命令行參數獲取 genres，默認值為 異世界
+    genre_names = args.genres[:2] or ["異世界"]
+    
+    output_path = MangaQuery().generate_html(genre_names)
+    print(f"HTML file generated: {output_path}")
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,24 @@
 from pathlib import Path
+import argparse
 import csv
-from db_genre_list import list_genres
+import shutil
+from db_genre_list import list_genres, write_genre_csv
 from html_genre import MangaQuery
+from html_render import page_name, render_genre_pages
+from html_shard import generate_sharded_html
+from catalog_snapshot import CatalogSnapshot
+from search_index import build_search_index
+from build_manifest import BuildManifest
+from html_assets import drop_compressed, optimize_site
 import html
 
-def get_genre_list():
-    # 調用 list_genres() 函數獲取 genre 列表
-    csv_path = list_genres()
+def get_genre_list(snapshot=None):
+    if snapshot is None:
+        # 調用 list_genres() 函數獲取 genre 列表
+        csv_path = list_genres()
+    else:
+        # 直接由快照計算，不需要額外查詢
+        csv_path = write_genre_csv(snapshot.genre_counts())
     
     genres = []
     with open(csv_path, 'r', encoding='utf-8') as f:
@@ -19,14 +31,53 @@ def get_genre_list():
     
     return genres
 
-def generate_genre_pages(genres):
-    query = MangaQuery()
-    try:
-        for genre, _ in genres:
-            print(f"Generating HTML for genre: {genre}")
-            query.generate_html([genre])
-    finally:
-        query.close()
+def generate_genre_pages(genres, snapshot=None, sharded=False, manifest=None, workers=None, thumbs=None):
+    mode = ("sharded" if sharded else "html") + ("+thumbs" if thumbs else "")
+    manifest = manifest or BuildManifest(force=True)
+
+    if snapshot is not None:
+        pages = [(genre, snapshot.get_manga_by_genres([genre])) for genre, _ in genres]
+    else:
+        query = MangaQuery()
+        pages = [(genre, [dict(record) for record in query.get_manga_by_genres([genre])])
+                 for genre, _ in genres]
+
+    # 只渲染輸入有變動的頁面；各模式都寫到同一個 docs/<genre>.html，
+    # 所以 key 是輸出路徑，模式則算進輸入 hash (切換模式時一定重建)
+    jobs, hashes, keys = [], [], set()
+    for genre, manga_list in pages:
+        # 每個 job 只帶該頁用到的縮圖，縮圖變動也要重建頁面
+        page_thumbs = {m["image"]: thumbs[m["image"]] for m in manga_list if m["image"] in thumbs} if thumbs else None
+        output_path = Path("docs") / f"{page_name([genre])}.html"
+        key = manifest.key(output_path)
+        keys.add(key)
+        input_hash = manifest.check(key, [mode, manga_list, page_thumbs], output_path)
+        if input_hash is not None:
+            jobs.append(([genre], manga_list, Path("docs"), page_thumbs))
+            hashes.append((key, input_hash))
+
+    if sharded:
+        # sharded 頁面主要是寫 JSON，依序產生即可
+        for genre_names, manga_list, _, page_thumbs in jobs:
+            generate_sharded_html(genre_names, manga_list, thumbs=page_thumbs)
+    else:
+        # 各 genre 頁面互不相關，以 process pool 平行渲染
+        render_genre_pages(jobs, workers)
+
+    for (key, input_hash), (genre_names, *_) in zip(hashes, jobs):
+        manifest.record(key, input_hash)
+        print(f"Generated HTML for genre: {genre_names[0]}")
+
+    remove_stale_pages(manifest, keys | {manifest.key(Path("docs") / "index.html")})
+
+def remove_stale_pages(manifest, keep):
+    """刪除上次建置產生、但 genre 已不存在 (或已低於門檻) 的頁面與其 shard / 壓縮檔"""
+    for key in manifest.prune("docs/*.html", keep):
+        page = Path(key)
+        page.unlink(missing_ok=True)
+        drop_compressed(page)
+        shutil.rmtree(page.parent / "data" / page.stem, ignore_errors=True)
+        print(f"Removed stale page: {page}")
 
 def generate_main_html(genres):
     html_content = """
@@ -52,6 +103,11 @@ def generate_main_html(genres):
     "></div>
 
     <h1>Manga Genres</h1>
+    <div class="search">
+        <input id="search-box" type="search" placeholder="Search title, short title or genre..." autocomplete="off">
+        <div id="search-status"></div>
+    </div>
+    <div id="search-results" class="manga-grid"></div>
     <div class="genre-grid">
 """
 
@@ -75,19 +131,75 @@ def generate_main_html(genres):
     output_dir = Path("docs")
     output_dir.mkdir(exist_ok=True)
     output_path = output_dir / "index.html"
+    drop_compressed(output_path)
     output_path.write_text(html_content, encoding="utf-8")
     return output_path
 
+def load_snapshot(args):
+    if args.per_genre:
+        return None
+    if args.snapshot:
+        print(f"Loading catalog snapshot from {args.snapshot}...")
+        return CatalogSnapshot.load(args.snapshot)
+    print("Fetching catalog snapshot...")
+    snapshot = CatalogSnapshot.from_backend()
+    if args.save_snapshot:
+        print(f"Catalog snapshot saved to: {snapshot.save(args.save_snapshot)}")
+    return snapshot
+
 def main():
+    parser = argparse.ArgumentParser(description="Build the docs/ site")
+    parser.add_argument("--snapshot", help="build from a local catalog snapshot (JSON Lines) instead of Neo4j")
+    parser.add_argument("--save-snapshot", help="save the fetched catalog snapshot to this path")
+    parser.add_argument("--per-genre", action="store_true", help="run one Neo4j query per genre page")
+    parser.add_argument("--sharded", action="store_true",
+                        help="emit chunked JSON data and virtual-scrolling shell pages")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-render pages whose input rows changed since the last build")
+    parser.add_argument("--optimize", action="store_true",
+                        help="minify HTML, fingerprint assets and write .gz/.br siblings")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes used to render genre pages (1 renders in this process)")
+    parser.add_argument("--thumbnails", action="store_true",
+                        help="mirror cover images locally as downscaled WebP/AVIF variants (needs a snapshot)")
+    args = parser.parse_args()
+
+    snapshot = load_snapshot(args)
+    # 非 incremental 時全部重建，但仍更新 manifest 供下次 incremental 使用
+    manifest = BuildManifest(force=not args.incremental)
+
     print("Getting genre list...")
-    genres = get_genre_list()
+    genres = get_genre_list(snapshot)
     
+    thumbs = None
+    if args.thumbnails and snapshot is not None:
+        print("Syncing thumbnails...")
+        from thumbnails import ThumbnailStore  # 需要 Pillow，只有使用 --thumbnails 時才載入
+        thumbs = ThumbnailStore().sync(manga["image"] for manga in snapshot.manga)
+    elif args.thumbnails:
+        print("Skipping thumbnails (needs a catalog snapshot)")
+
     print("Generating individual genre pages...")
-    generate_genre_pages(genres)
+    generate_genre_pages(genres, snapshot, args.sharded, manifest, args.workers, thumbs)
     
+    if snapshot is not None:
+        print("Building search index...")
+        search_dir = Path("docs") / "search"
+        manifest.build(manifest.key(search_dir / "meta.json"), snapshot.manga, search_dir / "meta.json",
+                       lambda: build_search_index(snapshot.manga, search_dir))
+    else:
+        print("Skipping search index (needs a catalog snapshot)")
+
     print("Generating main page...")
-    output_path = generate_main_html(genres)
-    print(f"Main page generated: {output_path}")
+    manifest.build(manifest.key(Path("docs") / "index.html"), genres, Path("docs") / "index.html",
+                   lambda: generate_main_html(genres))
+
+    if args.optimize:
+        print("Optimizing static assets...")
+        optimize_site()
+
+    print(f"Build manifest saved to: {manifest.save()}")
+    print(f"Pages built: {manifest.built}, skipped (unchanged): {manifest.skipped}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,179 @@
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+from pathlib import Path
+from html_assets import drop_compressed
+
+# 頁首頁尾模板在載入模組時建立一次 (str.format)，卡片以 f-string 渲染，
+# 分批寫入檔案，不再於迴圈中累加整頁字串
+
+GENRE_PAGE_HEAD = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Manga List - {title}</title>
+    <link rel="stylesheet" href="style.css">
+</head>
+<body>
+    <h1>Manga List - {title}</h1>
+    <div class="manga-grid">
+""".format
+
+GENRE_PAGE_TAIL = """
+    </div>
+    <button id="scroll-top">↑ Top</button>
+    <script src="script.js"></script>
+</body>
+</html>
+"""
+
+CHECK_PAGE_HEAD = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Manga Without Major Genres</title>
+    <link rel="stylesheet" href="style.css">
+</head>
+<body>
+    <h1>Manga Without Major Genres</h1>
+    <div class="info">
+        <h2>Major Genres (manga_count >= {threshold}):</h2>
+        <div class="genres">
+            {major_genres}
+        </div>
+    </div>
+{minor_section}    <div class="manga-grid">
+""".format
+
+# 未涵蓋漫畫上最常出現的 minor genres，可作為新的 merge 規則候選
+CHECK_PAGE_MINOR = """    <div class="info">
+        <h2>Frequent minor genres on these manga:</h2>
+        <div class="genres">
+            {minor_genres}
+        </div>
+    </div>
+""".format
+
+CHECK_PAGE_TAIL = """
+    </div>
+    <div class="summary">
+        Total: {count} manga without major genres
+    </div>
+    <button id="scroll-top">↑ Top</button>
+    <script src="script.js"></script>
+</body>
+</html>
+""".format
+
+def page_name(genre_names):
+    """File stem for a genre page, matching the links in index.html."""
+    return "_".join(genre_names).replace("/", "_").replace("\\", "_")
+
+# 同一個 genre 名稱在整個頁面 (以及整個 process) 只 escape 一次
+_genre_spans = {}
+
+def genre_span(genre):
+    span = _genre_spans.get(genre)
+    if span is None:
+        span = _genre_spans[genre] = f'<span>{escape(genre)}</span>'
+    return span
+
+def thumb_attrs(srcsets):
+    """本地縮圖的 srcset，由 script.js 的 lazy loader 套用到 <img> / <picture>"""
+    if not srcsets:
+        return ""
+    attrs = f' data-srcset="{escape(srcsets["webp"])}"'
+    if srcsets.get("avif"):
+        attrs += f' data-avif-srcset="{escape(srcsets["avif"])}"'
+    return attrs
+
+def render_card(manga, url=None, thumbs=None):
+    """卡片模板：f-string 在載入模組時就編譯完成"""
+    srcsets = thumbs.get(manga['image']) if thumbs else None
+    return f"""
+        <div class="manga-card">
+            <div class="loading" data-img="{escape(manga['image'])}"{thumb_attrs(srcsets)}>Loading...</div>
+            <div class="manga-title">
+                <a href="{escape(url or manga['url'])}" target="mypage">{escape(manga['title'])}</a>
+            </div>
+            <div class="manga-info">
+                Chapters: {manga['chapters'] or 0}
+            </div>
+            <div class="genres">
+                {"".join(map(genre_span, manga['genres']))}
+            </div>
+        </div>
+"""
+
+def write_cards(f, cards, chunk_size=256):
+    """每 chunk_size 張卡片寫入一次，避免大量小寫入也不需要整頁放在記憶體"""
+    chunk = []
+    count = 0
+    for card in cards:
+        chunk.append(card)
+        count += 1
+        if len(chunk) >= chunk_size:
+            f.write("".join(chunk))
+            chunk.clear()
+    f.write("".join(chunk))
+    return count
+
+def render_genre_page(genre_names, manga_list, output_dir=Path("docs"), thumbs=None, name=None):
+    """
+    Stream a genre page to docs/<genre>.html and return its path.
+
+    thumbs: {image url: {"webp": srcset, "avif": srcset}} from ThumbnailStore.sync
+    name: file stem, defaults to page_name(genre_names)
+    """
+    title = escape(" or ".join(genre_names))
+    output_dir = Path(output_dir)
+    output_dir.mkdir(exist_ok=True)
+    output_path = output_dir / f"{name or page_name(genre_names)}.html"
+
+    drop_compressed(output_path)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(GENRE_PAGE_HEAD(title=title))
+        write_cards(f, (render_card(manga, thumbs=thumbs) for manga in manga_list))
+        f.write(GENRE_PAGE_TAIL)
+    return output_path
+
+def render_check_page(records, major_genres, threshold, output_path, minor_genres=None):
+    """
+    Stream the major-genre coverage report; records are rendered as they arrive.
+
+    minor_genres: optional [(genre, count)] shown above the cards
+
+    Returns:
+        number of manga written
+    """
+    minor_section = ""
+    if minor_genres:
+        minor_section = CHECK_PAGE_MINOR(minor_genres=", ".join(
+            f"{escape(genre)} ({count})" for genre, count in minor_genres))
+    drop_compressed(output_path)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(CHECK_PAGE_HEAD(threshold=threshold, major_genres=", ".join(sorted(major_genres)),
+                                minor_section=minor_section))
+        count = write_cards(f, (render_card(record, url=record.get("url")
+                                            or f"https://jmanga.se/read/{record['manga_name']}-raw/")
+                                for record in records))
+        f.write(CHECK_PAGE_TAIL(count=count))
+    return count
+
+def _render_genre_job(job):
+    return render_genre_page(*job)
+
+def render_genre_pages(jobs, workers=None):
+    """
+    以 process pool 平行渲染多個 genre 頁面
+
+    Args:
+        jobs: list of (genre_names, manga_list[, output_dir, thumbs])
+        workers: process 數量，1 表示在目前的 process 依序渲染
+    """
+    if workers == 1 or len(jobs) <= 1:
+        return [_render_genre_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_render_genre_job, jobs))
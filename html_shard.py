@@ -0,0 +1,72 @@
+from pathlib import Path
+import html
+import json
+from html_assets import drop_compressed
+from html_render import page_name
+
+SHARD_SIZE = 200
+
+def manga_row(manga, thumbs=None):
+    """Compact card row: [title, url, image, chapters, genres(, webp srcset(, avif srcset))]"""
+    row = [manga["title"], manga["url"], manga["image"], manga["chapters"] or 0, manga["genres"]]
+    srcsets = thumbs.get(manga["image"]) if thumbs else None
+    if srcsets:
+        row.append(srcsets["webp"])
+        if srcsets.get("avif"):
+            row.append(srcsets["avif"])
+    return row
+
+def write_shards(data_dir, manga_list, shard_size=SHARD_SIZE, thumbs=None):
+    """將漫畫列表切成每 shard_size 筆一個 JSON 檔 (0.json, 1.json, ...)"""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    # 清掉上次產生、這次已經用不到的 shard
+    for old in data_dir.glob("*.json"):
+        old.unlink()
+        drop_compressed(old)
+
+    shard_count = 0
+    for start in range(0, len(manga_list), shard_size):
+        rows = [manga_row(m, thumbs) for m in manga_list[start:start + shard_size]]
+        shard_path = data_dir / f"{shard_count}.json"
+        shard_path.write_text(json.dumps(rows, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        shard_count += 1
+    return shard_count
+
+def generate_sharded_html(genre_names, manga_list, shard_size=SHARD_SIZE, thumbs=None):
+    """
+    產生只有外殼的 genre 頁面，卡片資料放在 docs/data/<genre>/ 的 JSON shards，
+    由 virtual-grid.js 只渲染可見範圍並依需要載入 shard
+    """
+    title = " or ".join(genre_names)
+    name = page_name(genre_names)
+
+    output_dir = Path("docs")
+    shard_count = write_shards(output_dir / "data" / name, manga_list, shard_size, thumbs)
+
+    html_content = f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Manga List - {html.escape(title)}</title>
+    <link rel="stylesheet" href="style.css">
+</head>
+<body>
+    <h1>Manga List - {html.escape(title)}</h1>
+    <div id="virtual-grid" class="manga-grid virtual"
+         data-base="data/{html.escape(name)}/"
+         data-total="{len(manga_list)}"
+         data-shards="{shard_count}"
+         data-shard-size="{shard_size}"></div>
+    <button id="scroll-top">↑ Top</button>
+    <script src="script.js"></script>
+    <script src="virtual-grid.js"></script>
+</body>
+</html>
+"""
+
+    output_path = output_dir / f"{name}.html"
+    drop_compressed(output_path)
+    output_path.write_text(html_content, encoding="utf-8")
+    return output_path
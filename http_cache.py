@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CachedResponse:
+    url: str
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+class ResponseCache:
+    """
+    URL 為 key 的 HTTP response 快取
+
+    body 以 sha256 內容定址並以 gzip 壓縮存放在 bodies/ 之下，
+    index.db 記錄每個 URL 對應的 body、ETag、Last-Modified 與最後使用時間，
+    總大小超過 max_bytes 時依最近最少使用 (LRU) 淘汰到 max_bytes * low_water 以下。
+    各方法以 lock 保護，可以由多個執行緒 (例如 asyncio.to_thread) 呼叫。
+    """
+
+    def __init__(self, cache_dir=".http_cache", max_bytes=2 * 1024 ** 3, low_water=0.9):
+        self.cache_dir = Path(cache_dir)
+        self.body_dir = self.cache_dir / "bodies"
+        self.body_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.conn = sqlite3.connect(self.cache_dir / "index.db", check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_body ON responses(body_hash)")
+        self.conn.commit()
+        # 總大小只在開啟時計算一次，之後隨新增 / 刪除 body 更新
+        self._total_bytes = self.total_bytes()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _body_path(self, body_hash: str) -> Path:
+        return self.body_dir / body_hash[:2] / f"{body_hash}.gz"
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self.lock:
+            return self._get(url)
+
+    def _get(self, url: str) -> Optional[CachedResponse]:
+        row = self.conn.execute(
+            "SELECT body_hash, etag, last_modified FROM responses WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        body_hash, etag, last_modified = row
+        try:
+            body = gzip.decompress(self._body_path(body_hash).read_bytes()).decode("utf-8")
+        except (OSError, EOFError) as e:
+            logger.warning(f"Cache body missing for {url}: {e}")
+            self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self.conn.commit()
+            self._drop_body_if_unused(body_hash)
+            return None
+        return CachedResponse(url, body, etag, last_modified)
+
+    @staticmethod
+    def conditional_headers(cached: Optional[CachedResponse]) -> Dict[str, str]:
+        """Build If-None-Match / If-Modified-Since headers for a revalidation request."""
+        headers = {}
+        if cached is None:
+            return headers
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        return headers
+
+    def touch(self, url: str):
+        """Mark an entry as used after a 304 revalidation."""
+        with self.lock:
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+
+    def put(self, url: str, body: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        with self.lock:
+            self._put(url, body, etag, last_modified)
+
+    def _put(self, url: str, body: str, etag: Optional[str], last_modified: Optional[str]):
+        data = body.encode("utf-8")
+        body_hash = hashlib.sha256(data).hexdigest()
+        path = self._body_path(body_hash)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_bytes(gzip.compress(data))
+            tmp_path.replace(path)
+
+        old = self.conn.execute("SELECT body_hash FROM responses WHERE url = ?", (url,)).fetchone()
+        size = path.stat().st_size
+        if not self._body_in_use(body_hash):
+            self._total_bytes += size
+        self.conn.execute("""
+            INSERT OR REPLACE INTO responses (url, body_hash, size, etag, last_modified, last_access)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (url, body_hash, size, etag, last_modified, time.time()))
+        self.conn.commit()
+        if old and old[0] != body_hash:
+            self._drop_body_if_unused(old[0])
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _body_in_use(self, body_hash: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM responses WHERE body_hash = ? LIMIT 1", (body_hash,)
+        ).fetchone() is not None
+
+    def _drop_body_if_unused(self, body_hash: str):
+        if not self._body_in_use(body_hash):
+            path = self._body_path(body_hash)
+            try:
+                self._total_bytes -= path.stat().st_size
+            except OSError:
+                # body 已經不在 (例如被手動刪除)，重新計算總大小
+                self._total_bytes = self.total_bytes()
+            path.unlink(missing_ok=True)
+
+    def total_bytes(self) -> int:
+        # 相同內容只存一份，因此以不重複的 body 計算
+        row = self.conn.execute("""
+            SELECT COALESCE(SUM(size), 0) FROM (SELECT body_hash, MAX(size) AS size FROM responses GROUP BY body_hash)
+        """).fetchone()
+        return row[0]
+
+    def evict(self):
+        with self.lock:
+            self._evict()
+
+    def _evict(self):
+        """
+        Drop least recently used entries until the cache fits in max_bytes * low_water,
+        so a full cache is not scanned again on every put.
+        """
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = int(self.max_bytes * self.low_water)
+        rows = self.conn.execute(
+            "SELECT url, body_hash, size FROM responses ORDER BY last_access"
+        ).fetchall()
+        evicted = 0
+        for url, body_hash, size in rows:
+            if self._total_bytes <= target:
+                break
+            self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            if not self._body_in_use(body_hash):
+                self._body_path(body_hash).unlink(missing_ok=True)
+                self._total_bytes -= size
+            evicted += 1
+        self.conn.commit()
+        logger.info(f"Evicted {evicted} cached responses, cache size now {self._total_bytes} bytes")
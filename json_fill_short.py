@@ -1,70 +1,102 @@
+import argparse
 import base64
+import logging
 import os
 import json
-from pathlib import Path
+import re
+import threading
+from collections import deque
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 from time import sleep
+from short_title_service import (FakeModelClient, ModelResponse, ShortTitleCache, ShortTitleService,
+                                 local_short_title, match_results, normalize_title)
+from short_title_manifest import ShortTitleManifest
+from catalog_store import CatalogStore
 
 load_result = load_dotenv()
 if not load_result:
     raise Exception(".env 檔案載入失敗")
 
-def get_todo_batch(json_files, processed_files):
-    docs_path = Path('docs_jmanga')
+def get_todo_batch(queue, batch_size=50):
+    """由 manifest 建立的待處理 queue 取出下一批 (不再重新讀取文件)"""
     todo_batch = []
-    
-    # 讀取所有 json 檔案
-    for json_file in json_files:
-        # 跳過已處理的檔案
-        if str(json_file) in processed_files:
-            continue
-            
-        with open(json_file, 'r', encoding='utf-8') as f:
-            try:
-                # print(json_file)
-                data = json.load(f)
-                if not data.get('short_title'):  # 如果 short_title 是空的
-                    todo_batch.append({
-                        'file_path': json_file,
-                        'title': data['title']
-                    })
-            except json.JSONDecodeError:
-                print(f"Error reading {json_file}")
-                continue
-            
-        if len(todo_batch) >= 50:  # 改為當達到50筆時停止
-            break
-            
+    while queue and len(todo_batch) < batch_size:
+        file_path, title = queue.popleft()
+        todo_batch.append({
+            'file_path': file_path,
+            'title': title
+        })
     return todo_batch
 
-def update_json_files(todo_batch, results):
-    updated_files = []
-    for item, result in zip(todo_batch, results):
-        file_path = item['file_path']
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        data['short_title'] = result['short']
-        print(f"{data['short_title']} <-- {data['title']}")
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-            
-        updated_files.append(str(file_path))
-    return updated_files
+def settle_locally(queue, manifest):
+    """
+    本地規則能縮短的標題直接寫入，不送給模型
 
-def process_batch(client, todo_batch):
-    if not todo_batch:
+    Returns:
+        (剩下要送給模型的 queue, 本地處理的文件數)
+    """
+    remaining = deque()
+    settled = 0
+    for file_path, title in queue:
+        short = local_short_title(title)
+        if short:
+            write_short_title(file_path, short)
+            manifest.mark_done(file_path, short)
+            settled += 1
+        else:
+            remaining.append((file_path, title))
+    return remaining, settled
+
+def scan_manifest(manifest, dirs, resume=False):
+    """掃描一次目錄更新 manifest；resume 時直接使用上次的 manifest"""
+    if resume:
+        print(f"Resuming from {manifest.path} without scanning")
         return []
+    files, read, known = manifest.scan(dirs)
+    print(f"Scanned {files} files, read {read} new or changed")
+    return known
+
+def write_short_title(file_path, short):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    data['short_title'] = short
+    print(f"{data['short_title']} <-- {data['title']}")
+    
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
 
+def update_json_files(todo_batch, results, manifest=None):
+    """
+    依 title 對應結果後寫入 (模型漏掉或調換順序時不會寫錯文件)
+
+    Returns:
+        (updated_files, missing_items) 沒有對應結果的項目由呼叫端重新排入 queue
+    """
+    matched, _ = match_results([item['title'] for item in todo_batch], results)
+    updated_files = []
+    missing_items = []
+    for item in todo_batch:
+        short = matched.get(item['title'])
+        if short is None:
+            missing_items.append(item)
+            continue
+        write_short_title(item['file_path'], short)
+        if manifest:
+            manifest.mark_done(item['file_path'], short)
+        updated_files.append(str(item['file_path']))
+    return updated_files, missing_items
+
+MODEL = "gemini-2.0-flash"
+
+def build_contents(titles):
     # 構建查詢文本
-    query_text = "\n".join(f"title:{item['title']}" for item in todo_batch)
+    query_text = "\n".join(f"title:{title}" for title in titles)
     query_text += "\n\n依每個 title，產生 7個字以下的日文或是3個words的英文"
 
-    model = "gemini-2.0-flash"
-    contents = [
+    return [
         types.Content(
             role="user",
             parts=[
@@ -72,7 +104,9 @@ def process_batch(client, todo_batch):
             ],
         ),
     ]
-    generate_content_config = types.GenerateContentConfig(
+
+def build_config():
+    return types.GenerateContentConfig(
         temperature=1,
         top_p=0.95,
         top_k=40,
@@ -120,12 +154,58 @@ def process_batch(client, todo_batch):
         ),
     )
 
+def parse_results(response):
+    """解析模型回應，格式不正確時回傳 None"""
+    # 確保回應是有效的 JSON 格式
+    if not response.strip().startswith('[') or not response.strip().endswith(']'):
+        print("Invalid JSON response format")
+        print("Response:", response)
+        return None
+
+    try:
+        results = json.loads(response)
+        if not isinstance(results, list):
+            print("Response is not a list")
+            print("Response:", response)
+            return None
+            
+        # 驗證每個結果是否符合預期格式
+        valid_results = []
+        for result in results:
+            if isinstance(result, dict) and 'title' in result and 'short' in result:
+                valid_results.append(result)
+            else:
+                print(f"Invalid result format: {result}")
+                
+        return valid_results
+
+    except json.JSONDecodeError as e:
+        print(f"JSON decode error: {e}")
+        print("Response:", response)
+        return None
+
+def salvage_results(response):
+    """從不完整的 JSON 陣列中取出已完整的 {"title", "short"} 物件"""
+    results = []
+    for match in re.finditer(r'\{[^{}]*\}', response):
+        try:
+            result = json.loads(match.group())
+        except json.JSONDecodeError:
+            continue
+        if isinstance(result, dict) and 'title' in result and 'short' in result:
+            results.append(result)
+    return results
+
+def process_batch(client, todo_batch):
+    if not todo_batch:
+        return []
+
     try:
         response = ""
         for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
+            model=MODEL,
+            contents=build_contents([item['title'] for item in todo_batch]),
+            config=build_config(),
         ):
             if hasattr(chunk, 'text'):
                 response += chunk.text
@@ -133,52 +213,65 @@ def process_batch(client, todo_batch):
                 print("Warning: Received chunk without text")
                 continue
 
-        # 確保回應是有效的 JSON 格式
-        if not response.strip().startswith('[') or not response.strip().endswith(']'):
-            print("Invalid JSON response format")
-            print("Response:", response)
-            return []
-
-        try:
-            results = json.loads(response)
-            if not isinstance(results, list):
-                print("Response is not a list")
-                print("Response:", response)
-                return []
-                
-            # 驗證每個結果是否符合預期格式
-            valid_results = []
-            for result in results:
-                if isinstance(result, dict) and 'title' in result and 'short' in result:
-                    valid_results.append(result)
-                else:
-                    print(f"Invalid result format: {result}")
-                    
-            return valid_results
-
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
-            print("Response:", response)
-            return []
+        return parse_results(response) or []
             
     except Exception as e:
         print(f"Error during API call: {e}")
         return []
 
-def generate():
+class GeminiShortTitleClient:
+    """ShortTitleService 的 Gemini 客戶端，回報截斷 (MAX_TOKENS / JSON 不完整) 與實際 token 用量"""
+
+    def __init__(self, api_key=None):
+        self.client = genai.Client(api_key=api_key or os.environ.get("GEMINI_API_KEY"))
+        self.config = build_config()
+
+    def generate(self, titles):
+        response = ""
+        finish_reason = None
+        tokens = 0
+        for chunk in self.client.models.generate_content_stream(
+            model=MODEL,
+            contents=build_contents(titles),
+            config=self.config,
+        ):
+            response += chunk.text or ""
+            if chunk.candidates and chunk.candidates[0].finish_reason:
+                finish_reason = chunk.candidates[0].finish_reason
+            if chunk.usage_metadata and chunk.usage_metadata.total_token_count:
+                tokens = chunk.usage_metadata.total_token_count
+
+        results = parse_results(response)
+        truncated = results is None or getattr(finish_reason, "name", finish_reason) == "MAX_TOKENS"
+        if results is None:
+            # 輸出被截斷時保留已完整的項目
+            results = salvage_results(response)
+        return ModelResponse(results, truncated=truncated, tokens=tokens)
+
+def generate(dirs=("docs_jmanga",), manifest_path="short_title_manifest.db", resume=False, local_rules=True):
     client = genai.Client(
         api_key=os.environ.get("GEMINI_API_KEY"),
     )
 
-    json_files = sorted(Path('docs_jmanga').glob('*.json'))
+    # 只掃描一次，之後的批次直接由 queue 取出
+    manifest = ShortTitleManifest(manifest_path)
+    scan_manifest(manifest, dirs, resume)
+    queue = deque(manifest.pending(dirs))
+    settled = 0
+    if local_rules:
+        queue, settled = settle_locally(queue, manifest)
+        print(f"Settled {settled} titles locally, saved about {-(-settled // 50)} LLM calls")
     processed_files = set()
+    attempts = {}
     batch_count = 0
     retry_count = 0
     max_retries = 3
+    todo_batch = []
     
     while True:
-        # 取得下一批要處理的檔案
-        todo_batch = get_todo_batch(json_files, processed_files)
+        # 取得下一批要處理的檔案 (重試時沿用同一批)
+        if not retry_count:
+            todo_batch = get_todo_batch(queue)
         
         if not todo_batch:
             print("All files have been processed")
@@ -191,10 +284,20 @@ def generate():
         results = process_batch(client, todo_batch)
         if results:
             # 更新檔案並記錄已處理的檔案
-            updated_files = update_json_files(todo_batch, results)
+            updated_files, missing_items = update_json_files(todo_batch, results, manifest)
             processed_files.update(updated_files)
             print(f"Successfully processed {len(updated_files)} files in batch {batch_count}")
             retry_count = 0  # 重置重試計數
+
+            # 只有沒對應到結果的項目重新排入 queue
+            for item in missing_items:
+                attempts[item['file_path']] = attempts.get(item['file_path'], 0) + 1
+                if attempts[item['file_path']] < max_retries:
+                    queue.append((item['file_path'], item['title']))
+                else:
+                    print(f"No result for {item['title']} after {max_retries} attempts, skipping")
+            if missing_items:
+                print(f"{len(missing_items)} titles missing from the response")
             
             # 在批次之間暫停一下，避免過度請求
             if len(todo_batch) == 50:
@@ -211,8 +314,113 @@ def generate():
             sleep(10)
             continue
             
+    manifest.close()
     print(f"\nCompleted processing all files in {batch_count} batches")
-    print(f"Total files processed: {len(processed_files)}")
+    print(f"Total files processed: {len(processed_files) + settled} ({settled} by local rules)")
+
+def collect_titles(manifest, dirs, cache, resume=False):
+    """
+    由 manifest 取得沒有 short_title 的文件並依正規化標題分組；
+    本次掃描讀到已有 short_title 的文件寫入快取 (其他目錄的相同標題就不用再送出)
+
+    Returns:
+        {normalized title: (title, [file paths])}
+    """
+    cache.put_many(scan_manifest(manifest, dirs, resume))
+    todo = {}
+    for file_path, title in manifest.pending(dirs):
+        _, files = todo.setdefault(normalize_title(title), (title, []))
+        files.append(file_path)
+    return todo
+
+def collect_store_titles(store, cache):
+    """
+    與 collect_titles 相同，但直接查詢 CatalogStore，不需要掃描目錄
+
+    Returns:
+        {normalized title: (title, [urls])}
+    """
+    cache.put_many(store.known_short_titles())
+    todo = {}
+    for url, title in store.pending_short_titles():
+        _, urls = todo.setdefault(normalize_title(title), (title, []))
+        urls.append(url)
+    return todo
+
+def generate_concurrent(dirs=("docs_jmanga",), concurrency=4, rpm=15, tpm=1_000_000, batch_size=50,
+                        cache_path="short_title_cache.db", fake=False,
+                        manifest_path="short_title_manifest.db", resume=False, local_rules=True, store_path=None):
+    """store_path 指定時由 CatalogStore 讀寫 short_title，不使用 dirs 與 manifest"""
+    cache = ShortTitleCache(cache_path)
+    store = CatalogStore(store_path) if store_path else None
+    manifest = ShortTitleManifest(manifest_path) if store is None else None
+    client = FakeModelClient() if fake else GeminiShortTitleClient()
+    service = ShortTitleService(client, cache, concurrency, rpm, tpm, batch_size, local_rules=local_rules)
+    lock = threading.Lock()
+    updated = []
+
+    def on_result(title, short):
+        # 結果一產生就寫回所有同標題的文件，中斷後重新執行也只需處理剩下的
+        _, files = todo[normalize_title(title)]
+        with lock:
+            for file_path in files:
+                if store is not None:
+                    store.set_short_title(file_path, short)
+                else:
+                    write_short_title(file_path, short)
+                    manifest.mark_done(file_path, short)
+                updated.append(str(file_path))
+
+    try:
+        if store is not None:
+            todo = collect_store_titles(store, cache)
+        else:
+            todo = collect_titles(manifest, dirs, cache, resume)
+        print(f"{sum(len(files) for _, files in todo.values())} files without short title "
+              f"({len(todo)} distinct titles)")
+        service.shorten([title for title, _ in todo.values()], on_result)
+    finally:
+        cache.close()
+        if store is not None:
+            store.close()
+        else:
+            manifest.close()
+
+    stats = service.stats
+    print(f"\nFiles updated: {len(updated)}")
+    print(f"Titles from cache: {stats.cached}, local rules: {stats.local}, "
+          f"generated: {stats.generated}, failed: {stats.failed}")
+    print(f"LLM calls saved by local rules: ~{service.saved_requests()}")
+    print(f"Requests: {stats.requests} ({stats.truncated} truncated), batch sizes: {stats.batch_sizes}")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill short_title in manga JSON files")
+    parser.add_argument("dirs", nargs="*", default=["docs_jmanga"])
+    parser.add_argument("--concurrency", type=int, default=4, help="batches in flight at once")
+    parser.add_argument("--rpm", type=int, default=15, help="requests per minute budget")
+    parser.add_argument("--tpm", type=int, default=1_000_000, help="tokens per minute budget")
+    parser.add_argument("--batch-size", type=int, default=50, help="initial batch size (adapted at runtime)")
+    parser.add_argument("--cache", default="short_title_cache.db", help="short title cache (SQLite)")
+    parser.add_argument("--manifest", default="short_title_manifest.db", help="pending-title manifest (SQLite)")
+    parser.add_argument("--resume", action="store_true",
+                        help="take pending titles from the manifest without scanning the directories")
+    parser.add_argument("--no-local-rules", action="store_true",
+                        help="send every title to the model, even those the local rules can shorten")
+    parser.add_argument("--store", help="fill short titles in a consolidated catalog store (catalog_store.py) "
+                                        "instead of the JSON files in dirs")
+    parser.add_argument("--fake", action="store_true", help="use a local fake model instead of Gemini")
+    parser.add_argument("--legacy", action="store_true", help="one batch at a time (original loop)")
+    args = parser.parse_args()
+    if args.legacy and args.store:
+        parser.error("--store is not supported with --legacy")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.legacy:
+        generate(args.dirs, args.manifest, args.resume, not args.no_local_rules)
+    else:
+        generate_concurrent(args.dirs, args.concurrency, args.rpm, args.tpm, args.batch_size, args.cache, args.fake,
+                            args.manifest, args.resume, not args.no_local_rules, args.store)
 
 if __name__ == "__main__":
-    generate()
+    main()
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import argparse
 import requests
 from bs4 import BeautifulSoup
 import json
@@ -7,7 +8,11 @@ from typing import List
 from dataclasses import dataclass
 from pathlib import Path
 from json_mange_detail import MangaDetailScraper
+from crawl_state import CrawlState, content_hash, NEW, UNCHANGED
+from catalog_store import CatalogStore
+from dataclasses import asdict
 from time import sleep
+import hashlib
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,6 +25,7 @@ class MangaItem:
     title: str
     url: str
     genres: List[str]
+    list_hash: str = ""  # 列表頁項目內容的 hash，用於判斷是否有更新
 
 class JMangaScraper:
     BASE_URL = "https://jmanga.se"
@@ -36,51 +42,58 @@ class JMangaScraper:
 
     def get_manga_list(self, page) -> List[MangaItem]:
         """Fetch and parse the manga list from multiple pages."""
-        all_manga_items = []
-        
         url = f"{self.BASE_URL}/{self.genre}/?p={page}"
         try:
             logger.info(f"Fetching manga list from page {page}: {url}")
             response = self.session.get(url)
             response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            manga_details = soup.find_all('div', class_='manga-detail')
-            
-            if not manga_details:
-                logger.info(f"No manga found on page {page}, stopping pagination")
-                return
-                
-            logger.info(f"Found {len(manga_details)} manga entries on page {page}")
-            
-            for detail in manga_details:
-                try:
-                    # Get title and URL from the manga-name section
-                    title_element = detail.find('h3', class_='manga-name').find('a')
-                    title = title_element.get('title', '').strip()
-                    url = title_element.get('href', '').strip()
-                    
-                    # Get genres from fd-infor section
-                    genres = []
-                    genre_elements = detail.find('div', class_='fd-infor').find_all('a')
-                    for genre in genre_elements:
-                        genre_text = genre.get_text().strip()
-                        if genre_text:
-                            genres.append(genre_text)
-                    
-                    all_manga_items.append(MangaItem(
-                        title=title,
-                        url=url,
-                        genres=genres
-                    ))
-                    
-                except Exception as e:
-                    logger.error(f"Error parsing manga entry on page {page}: {e}")
-                    continue
-            
         except requests.RequestException as e:
             logger.error(f"Failed to fetch manga list for page {page}: {e}")
             return
+
+        return self.parse_manga_list(response.text, page)
+
+    def parse_manga_list(self, html_content: str, page) -> List[MangaItem]:
+        """Parse a list page into manga items."""
+        all_manga_items = []
+
+        soup = BeautifulSoup(html_content, 'html.parser')
+        manga_details = soup.find_all('div', class_='manga-detail')
+        
+        if not manga_details:
+            logger.info(f"No manga found on page {page}, stopping pagination")
+            return
+            
+        logger.info(f"Found {len(manga_details)} manga entries on page {page}")
+        
+        for detail in manga_details:
+            try:
+                # Get title and URL from the manga-name section
+                title_element = detail.find('h3', class_='manga-name').find('a')
+                title = title_element.get('title', '').strip()
+                url = title_element.get('href', '').strip()
+                
+                # Get genres from fd-infor section
+                genres = []
+                genre_elements = detail.find('div', class_='fd-infor').find_all('a')
+                for genre in genre_elements:
+                    genre_text = genre.get_text().strip()
+                    if genre_text:
+                        genres.append(genre_text)
+                
+                # 列表頁項目的全部文字 (含最新章節)，有變動代表需要重新抓取
+                entry_text = " ".join(detail.get_text(" ").split())
+                
+                all_manga_items.append(MangaItem(
+                    title=title,
+                    url=url,
+                    genres=genres,
+                    list_hash=hashlib.sha1(entry_text.encode('utf-8')).hexdigest()
+                ))
+                
+            except Exception as e:
+                logger.error(f"Error parsing manga entry on page {page}: {e}")
+                continue
             
         logger.info(f"Total manga items collected: {len(all_manga_items)}")
         return all_manga_items
@@ -100,8 +113,28 @@ class JMangaScraper:
         except Exception as e:
             logger.error(f"Failed to save manga list to JSON: {e}")
 
-def main(genre, start_page, end_page):
+def safe_filename(title: str) -> str:
+    """Build the JSON file stem used for a manga title."""
+    safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_'))
+    return safe_title.strip()
+
+def load_short_title(*paths: Path) -> str:
+    """Keep a short_title filled by json_fill_short when a detail is re-fetched."""
+    for path in paths:
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('short_title', '')
+    return ''
+
+def main(genre, start_page, end_page, incremental=False, stop_after=3, store=None):
+    """
+    incremental=True 時只抓取 crawl state 中新出現或列表頁資料有變動的漫畫，
+    並在連續 stop_after 頁都沒有變動時停止翻頁。
+
+    store: CatalogStore，指定時詳細資料寫入 catalog_store.db 而不是 docs_jmanga/ 的個別文件
+    """
     scraper = JMangaScraper(genre)
+    state = CrawlState()
 
     # 確保目錄存在
     docs_dir = Path('docs_jmanga')
@@ -109,41 +142,77 @@ def main(genre, start_page, end_page):
     docs_dir.mkdir(exist_ok=True)
     docs_imported_dir.mkdir(exist_ok=True)
 
-    for page in range(start_page, end_page + 1):
-        manga_list = scraper.get_manga_list(page)
-    
-        if manga_list:
+    # 初始化 detail scraper
+    detail_scraper = MangaDetailScraper()
+    unchanged_pages = 0
+
+    try:
+        for page in range(start_page, end_page + 1):
+            manga_list = scraper.get_manga_list(page)
+        
+            if not manga_list:
+                logger.warning("No manga found")
+                continue
+
             logger.info(f"Successfully scraped {len(manga_list)} manga titles")
-            
-            # 初始化 detail scraper
-            detail_scraper = MangaDetailScraper()
+            page_changed = False
             
             # 處理每個漫畫
             for manga in manga_list:
                 # 創建安全的文件名
-                safe_title = "".join(c for c in manga.title if c.isalnum() or c in (' ', '-', '_'))
-                safe_title = safe_title.strip()
-                
-                # 檢查兩個目錄中是否存在文件
+                safe_title = safe_filename(manga.title)
                 docs_path = docs_dir / f"{safe_title}.json"
                 docs_imported_path = docs_imported_dir / f"{safe_title}.json"
-                
-                # 如果兩個目錄都沒有該文件，才進行下載
-                if not docs_path.exists() and not docs_imported_path.exists():
-                    logger.info(f"Fetching details for: {manga.title}")
-                    try:
-                        # 獲取並保存詳細信息到 docs_jmanga 目錄
-                        manga_detail = detail_scraper.get_manga_detail(manga.url)
-                        if manga_detail:
-                            # 保存到 docs_jmanga 目錄
+
+                if store is not None:
+                    # 以 URL 查詢 store，不需要檢查文件
+                    exists = store.get(manga.url) is not None
+                else:
+                    exists = docs_path.exists() or docs_imported_path.exists()
+
+                if incremental:
+                    status = state.classify(manga.url, manga.list_hash)
+                    if status == NEW and exists:
+                        # 在 crawl state 建立之前就已經抓過的漫畫，只記錄不重新抓取
+                        status = UNCHANGED
+                elif exists:
+                    status = UNCHANGED
+                else:
+                    status = NEW
+
+                if status == UNCHANGED:
+                    logger.info(f"Details already up to date for: {manga.title}")
+                    state.mark_seen(manga.url, manga.title, manga.list_hash)
+                    continue
+
+                page_changed = True
+                logger.info(f"Fetching details for ({status}): {manga.title}")
+                try:
+                    # 獲取並保存詳細信息到 docs_jmanga 目錄
+                    manga_detail = detail_scraper.get_manga_detail(manga.url)
+                    if manga_detail:
+                        if store is not None:
+                            manga_detail.short_title = store.short_title(manga.url)
+                        else:
+                            manga_detail.short_title = load_short_title(docs_path, docs_imported_path)
+                        detail_hash = content_hash(asdict(manga_detail))
+                        if store is not None:
+                            detail_scraper.save_to_store(manga_detail, store, f"{safe_title}.json", docs_dir)
+                        elif detail_hash != state.get_content_hash(manga.url) or not exists:
+                            # 保存到 docs_jmanga 目錄 (內容沒變但文件被刪除時也要重新寫入)
                             detail_scraper.save_to_json(manga_detail, docs_path)
                         else:
-                            logger.warning(f"Failed to get details for: {manga.title}")
-                    except Exception as e:
-                        logger.error(f"Error processing {manga.title}: {e}")
-                    sleep(0.5)
-                else:
-                    logger.info(f"Details already exist for: {manga.title} in {'docs_jmanga' if docs_path.exists() else 'docs_imported'}")
+                            logger.info(f"Details unchanged for: {manga.title}")
+                        state.mark_fetched(manga.url, manga.title, manga.list_hash,
+                                           manga_detail.chapter_count, detail_hash)
+                    else:
+                        logger.warning(f"Failed to get details for: {manga.title}")
+                except Exception as e:
+                    logger.error(f"Error processing {manga.title}: {e}")
+                sleep(0.5)
+            state.commit()
+            if store is not None:
+                store.commit()
             
             # 打印樣本信息
             print("\nSample of manga list:")
@@ -151,9 +220,29 @@ def main(genre, start_page, end_page):
                 print(f"\nTitle: {manga.title}")
                 print(f"URL: {manga.url}")
                 print(f"Genres: {', '.join(manga.genres)}")
-        else:
-            logger.warning("No manga found")
+
+            unchanged_pages = 0 if page_changed else unchanged_pages + 1
+            if incremental and unchanged_pages >= stop_after:
+                logger.info(f"{unchanged_pages} unchanged pages in a row, stopping at page {page}")
+                break
+    finally:
+        state.close()
 
 if __name__ == "__main__":
-    main('少年マンガ', 1, 100)
+    parser = argparse.ArgumentParser(description="Scrape a JManga genre into docs_jmanga/")
+    parser.add_argument("genre", nargs="?", default="少年マンガ")
+    parser.add_argument("start_page", nargs="?", type=int, default=1)
+    parser.add_argument("end_page", nargs="?", type=int, default=100)
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch new or changed manga and stop after unchanged pages")
+    parser.add_argument("--stop-after", type=int, default=3)
+    parser.add_argument("--store", help="save details to a consolidated catalog store (catalog_store.py)")
+    args = parser.parse_args()
+
+    store = CatalogStore(args.store) if args.store else None
+    try:
+        main(args.genre, args.start_page, args.end_page, args.incremental, args.stop_after, store)
+    finally:
+        if store is not None:
+            store.close()
     sleep(2)
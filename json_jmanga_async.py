@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from json_jmanga import JMangaScraper, MangaItem, safe_filename
+from json_mange_detail import MangaDetailScraper, MangaDetail
+from http_cache import ResponseCache
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Async token bucket: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                # 等到下一個 token 產生
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class HostRateLimiter:
+    """One token bucket per host."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    async def acquire(self, url: str):
+        host = urlsplit(url).netloc
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = TokenBucket(self.rate, self.capacity)
+        await bucket.acquire()
+
+class AsyncJMangaScraper:
+    """
+    Fetch list and detail pages concurrently over one shared connection pool.
+
+    BeautifulSoup 解析、response cache (SQLite + 磁碟) 與 JSON 寫入都以 asyncio.to_thread 執行，
+    event loop 只負責網路 I/O
+    """
+
+    def __init__(self, genre, concurrency: int = 8, rate: float = 4.0, burst: Optional[float] = None,
+                 list_retries: int = 3):
+        self.genre = genre
+        self.concurrency = concurrency
+        self.list_retries = list_retries
+        self.list_scraper = JMangaScraper(genre)
+        self.detail_scraper = MangaDetailScraper()
+        self.headers = dict(self.list_scraper.session.headers)
+        self.limiter = HostRateLimiter(rate, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency)
+        self.session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def fetch(self, url: str, cache: Optional[ResponseCache] = None) -> Optional[str]:
+        """GET a page under the concurrency limit and the per-host rate limit."""
+        cached = await asyncio.to_thread(cache.get, url) if cache else None
+        async with self.semaphore:
+            await self.limiter.acquire(url)
+            try:
+                async with self.session.get(url, headers=ResponseCache.conditional_headers(cached)) as response:
+                    if response.status == 304 and cached:
+                        await asyncio.to_thread(cache.touch, url)
+                        return cached.body
+                    response.raise_for_status()
+                    html_content = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Failed to fetch {url}: {e}")
+                return None
+
+        if cache:
+            await asyncio.to_thread(cache.put, url, html_content,
+                                    response.headers.get('ETag'),
+                                    response.headers.get('Last-Modified'))
+        return html_content
+
+    async def get_manga_list(self, page) -> Optional[List[MangaItem]]:
+        """
+        Returns:
+            列表頁的漫畫 (空頁為 [])；重試 list_retries 次仍抓取失敗時回傳 None
+        """
+        url = f"{JMangaScraper.BASE_URL}/{self.genre}/?p={page}"
+        for attempt in range(1, self.list_retries + 1):
+            logger.info(f"Fetching manga list from page {page}: {url}")
+            html_content = await self.fetch(url)
+            if html_content is not None:
+                return await asyncio.to_thread(self.list_scraper.parse_manga_list, html_content, page) or []
+            if attempt < self.list_retries:
+                await asyncio.sleep(2 ** attempt)
+        logger.error(f"Giving up on list page {page} after {self.list_retries} attempts")
+        return None
+
+    async def get_manga_detail(self, url: str) -> Optional[MangaDetail]:
+        html_content = await self.fetch(url, self.detail_scraper.cache)
+        if html_content is None:
+            return None
+        return await asyncio.to_thread(self.detail_scraper.parse_html, url, html_content)
+
+    async def save_manga_detail(self, manga: MangaItem, file_path: Path):
+        logger.info(f"Fetching details for: {manga.title}")
+        try:
+            manga_detail = await self.get_manga_detail(manga.url)
+            if manga_detail:
+                await asyncio.to_thread(self.detail_scraper.save_to_json, manga_detail, file_path)
+            else:
+                logger.warning(f"Failed to get details for: {manga.title}")
+        except Exception as e:
+            logger.error(f"Error processing {manga.title}: {e}")
+
+async def crawl(genre, start_page, end_page, concurrency=8, rate=4.0, burst=None):
+    """Crawl list pages in windows of `concurrency` pages and fetch details as soon as each list arrives."""
+    docs_dir = Path('docs_jmanga')
+    docs_imported_dir = Path('docs_imported')
+    docs_dir.mkdir(exist_ok=True)
+    docs_imported_dir.mkdir(exist_ok=True)
+
+    detail_tasks = []
+    scheduled = set()
+    failed_pages = []
+    total = 0
+    async with AsyncJMangaScraper(genre, concurrency, rate, burst) as scraper:
+        page = start_page
+        while page <= end_page:
+            window = range(page, min(page + concurrency, end_page + 1))
+            manga_lists = await asyncio.gather(*(scraper.get_manga_list(p) for p in window))
+
+            reached_end = False
+            for p, manga_list in zip(window, manga_lists):
+                if manga_list is None:
+                    # 抓取失敗不代表已到最後一頁，與同步版本一樣略過該頁繼續
+                    failed_pages.append(p)
+                    continue
+                if not manga_list:
+                    # 空頁表示已經到最後一頁
+                    reached_end = True
+                    continue
+                total += len(manga_list)
+                for manga in manga_list:
+                    # 同一部漫畫出現在多個列表頁時只抓一次
+                    if manga.url in scheduled:
+                        continue
+                    scheduled.add(manga.url)
+                    safe_title = safe_filename(manga.title)
+                    docs_path = docs_dir / f"{safe_title}.json"
+                    docs_imported_path = docs_imported_dir / f"{safe_title}.json"
+                    if docs_path.exists() or docs_imported_path.exists():
+                        logger.info(f"Details already exist for: {manga.title}")
+                        continue
+                    detail_tasks.append(asyncio.create_task(scraper.save_manga_detail(manga, docs_path)))
+
+            if reached_end:
+                logger.info("Reached the last list page, stopping pagination")
+                break
+            page += concurrency
+
+        await asyncio.gather(*detail_tasks)
+
+    logger.info(f"Scraped {total} manga titles, fetched {len(detail_tasks)} details")
+    if failed_pages:
+        logger.warning(f"List pages that could not be fetched: {failed_pages}")
+
+def main(genre, start_page, end_page, concurrency=8, rate=4.0, burst=None):
+    asyncio.run(crawl(genre, start_page, end_page, concurrency, rate, burst))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape a JManga genre into docs_jmanga/ with concurrent requests")
+    parser.add_argument("genre", nargs="?", default="少年マンガ")
+    parser.add_argument("start_page", nargs="?", type=int, default=1)
+    parser.add_argument("end_page", nargs="?", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight and list pages per window")
+    parser.add_argument("--rate", type=float, default=4.0, help="requests per second per host")
+    parser.add_argument("--burst", type=float, default=None, help="token bucket capacity (default: max(1, rate))")
+    args = parser.parse_args()
+
+    main(args.genre, args.start_page, args.end_page, args.concurrency, args.rate, args.burst)
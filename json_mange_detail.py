@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+import importlib.util
 import logging
 from typing import List, Dict, Optional
 from dataclasses import dataclass
-import os
-from datetime import datetime
 import json
 from pathlib import Path
+from http_cache import ResponseCache
 
 logging.basicConfig(
     level=logging.INFO,
@@ -27,8 +27,31 @@ class MangaDetail:
     image: str
     related_manga: List[Dict[str, str]] = None  # 設置默認值為 None
 
+# 詳細頁面中各 extractor 需要的區塊 class，strained backend 只解析這些子樹
+DETAIL_CLASSES = ['chapter-item', 'manga-name', 'genres', 'description', 'manga-poster']
+
+# backend 名稱 -> (BeautifulSoup features, 是否使用 SoupStrainer)
+PARSER_BACKENDS = {
+    'html.parser': ('html.parser', False),
+    'html.parser-strained': ('html.parser', True),
+    'lxml': ('lxml', False),
+    'lxml-strained': ('lxml', True),
+}
+
+def default_parser_backend() -> str:
+    """Prefer lxml when it is installed."""
+    if importlib.util.find_spec('lxml') is not None:
+        return 'lxml-strained'
+    return 'html.parser-strained'
+
+def make_soup(html_content: str, backend: str) -> BeautifulSoup:
+    """Parse HTML with the given backend from PARSER_BACKENDS."""
+    features, strained = PARSER_BACKENDS[backend]
+    parse_only = SoupStrainer(class_=DETAIL_CLASSES) if strained else None
+    return BeautifulSoup(html_content, features, parse_only=parse_only)
+
 class MangaDetailScraper:
-    def __init__(self):
+    def __init__(self, cache: Optional[ResponseCache] = None, parser: Optional[str] = None):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -39,37 +62,47 @@ class MangaDetailScraper:
         # 確保 docs_jmanga 目錄存在
         self.docs_dir = Path('docs_jmanga')
         self.docs_dir.mkdir(exist_ok=True)
+        # 詳細頁面的 response 快取，重新爬取時以 ETag/Last-Modified 做條件請求
+        self.cache = cache if cache is not None else ResponseCache()
+        # HTML parser backend，見 PARSER_BACKENDS
+        self.parser = parser or default_parser_backend()
 
-    def fetch_and_save_html(self, url: str, filename: str = "test.html") -> Optional[str]:
-        """Fetch HTML content and save it to a file."""
+    def fetch_and_save_html(self, url: str, filename: Optional[str] = None) -> Optional[str]:
+        """Fetch HTML content (revalidating the cached copy) and optionally save it to a file."""
         try:
-            logger.info(f"Fetching content from {url}")
-            response = self.session.get(url)
-            response.raise_for_status()
-            
-            # Save HTML content with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            base, ext = os.path.splitext(filename)
-            filename_with_timestamp = f"{base}{ext}"
-            
-            with open(filename_with_timestamp, 'w', encoding='utf-8') as f:
-                f.write(response.text)
-            logger.info(f"Saved HTML content to {filename_with_timestamp}")
+            cached = self.cache.get(url)
+            logger.info(f"Fetching content from {url}{' (conditional)' if cached else ''}")
+            response = self.session.get(url, headers=self.cache.conditional_headers(cached))
+
+            if response.status_code == 304 and cached:
+                logger.info(f"Not modified, using cached content for {url}")
+                self.cache.touch(url)
+                html_content = cached.body
+            else:
+                response.raise_for_status()
+                html_content = response.text
+                self.cache.put(url, html_content,
+                               response.headers.get('ETag'),
+                               response.headers.get('Last-Modified'))
+
+            if filename:
+                with open(filename, 'w', encoding='utf-8') as f:
+                    f.write(html_content)
+                logger.info(f"Saved HTML content to {filename}")
             
-            return response.text
+            return html_content
             
         except requests.RequestException as e:
             logger.error(f"Failed to fetch content: {e}")
             return None
 
     def parse_html(self, url: str, html_content: str) -> Optional[MangaDetail]:
-        """Parse HTML content and extract manga details."""
+        """Parse HTML content once and extract manga details."""
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
+            soup = make_soup(html_content, self.parser)
             
             # Get chapter count from chapter-item
-            chapter_items = soup.find_all('li', class_='chapter-item')
-            chapter_count = len(chapter_items)
+            chapter_count = self._get_chapter_count(soup)
             logger.info(f"Found {chapter_count} chapters")
 
             # Extract basic information
@@ -80,7 +113,7 @@ class MangaDetailScraper:
             image = self._get_image(soup)
             
             # Get related manga and log the results
-            related_manga = self.get_related_manga(html_content)
+            related_manga = self.get_related_manga(soup)
             logger.info(f"Related manga count: {len(related_manga)}")
             for manga in related_manga:
                 logger.debug(f"Related manga found: {manga['title']}")
@@ -108,6 +141,10 @@ class MangaDetailScraper:
             return self.parse_html(url, html_content)
         return None
 
+    def _get_chapter_count(self, detail_section: BeautifulSoup) -> int:
+        """Count chapter items in detail section."""
+        return len(detail_section.find_all('li', class_='chapter-item'))
+
     def _get_title(self, detail_section: BeautifulSoup) -> str:
         """Extract the main title from detail section."""
         title_elem = detail_section.find('h2', class_='manga-name')
@@ -137,14 +174,13 @@ class MangaDetailScraper:
         image_elem = image_elem and image_elem.find('img')
         return image_elem.get('data-src', '').strip() if image_elem else ""
 
-    def get_related_manga(self, html_content: str) -> List[Dict[str, str]]:
+    def get_related_manga(self, detail_section: BeautifulSoup) -> List[Dict[str, str]]:
         """Extract related manga links and titles."""
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
             related_items = []
             
             # 找到相關漫畫列表區域
-            related_sections = soup.find_all('h3', class_='manga-name')
+            related_sections = detail_section.find_all('h3', class_='manga-name')
             for related_section in related_sections:
                 manga_links = related_section.find('a')
                 
@@ -164,21 +200,33 @@ class MangaDetailScraper:
             logger.error(f"Failed to parse related manga: {e}")
             return []
 
+    @staticmethod
+    def to_dict(manga_detail: MangaDetail) -> dict:
+        # 將 MangaDetail 對象轉換為字典 (JSON 文件與 CatalogStore 相同的欄位順序)
+        return {
+            'title': manga_detail.title,
+            'short_title': manga_detail.short_title,
+            'chapter_count': manga_detail.chapter_count,
+            'url': manga_detail.url,
+            'genres': manga_detail.genres,
+            'status': manga_detail.status,
+            'summary': manga_detail.summary,
+            'image': manga_detail.image,
+            'related_manga': manga_detail.related_manga
+        }
+
+    def save_to_store(self, manga_detail: MangaDetail, store, filename: Optional[str] = None,
+                      directory: Optional[Path] = None) -> bool:
+        """Save manga detail to a CatalogStore; returns False when unchanged."""
+        written = store.put(self.to_dict(manga_detail), filename=filename, directory=directory)
+        if written:
+            logger.info(f"Saved manga detail to {store.path}: {manga_detail.title}")
+        return written
+
     def save_to_json(self, manga_detail: MangaDetail, file_path: Path) -> None:
         """Save manga detail to JSON file."""
         try:
-            # 將 MangaDetail 對象轉換為字典
-            manga_dict = {
-                'title': manga_detail.title,
-                'short_title': manga_detail.short_title,
-                'chapter_count': manga_detail.chapter_count,
-                'url': manga_detail.url,
-                'genres': manga_detail.genres,
-                'status': manga_detail.status,
-                'summary': manga_detail.summary,
-                'image': manga_detail.image,
-                'related_manga': manga_detail.related_manga
-            }
+            manga_dict = self.to_dict(manga_detail)
             
             # 寫入 JSON 文件
             with open(file_path, 'w', encoding='utf-8') as f:
@@ -0,0 +1,74 @@
+from collections import defaultdict
+from pathlib import Path
+import json
+import re
+import unicodedata
+from html_assets import drop_compressed
+
+INDEX_SHARDS = 64
+DOC_SHARD_SIZE = 500
+
+def normalize_text(text):
+    """NFKC + 小寫 + 去除空白，必須與 script.js 的 normalizeText 一致"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", text or "").lower())
+
+def bigrams(text):
+    """字元 2-gram，日文標題不需要斷詞"""
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def gram_shard(gram, shards=INDEX_SHARDS):
+    """FNV-1a (32 bit) over code points，必須與 script.js 的 gramShard 一致"""
+    h = 0x811c9dc5
+    for ch in gram:
+        h ^= ord(ch)
+        h = (h * 0x01000193) & 0xffffffff
+    return h % shards
+
+def doc_row(manga):
+    """[title, short_title, url, chapters, genres]"""
+    return [manga["title"], manga["name"] or "", manga["url"], manga["chapters"] or 0, manga["genres"]]
+
+def write_json(path, data):
+    drop_compressed(path)
+    path.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+
+def build_search_index(manga_list, output_dir=Path("docs") / "search"):
+    """
+    產生 title / short_title / genres 的 2-gram 反向索引
+
+    docs/search/meta.json       shard 數量等設定
+    docs/search/index/<k>.json  {gram: [doc id, ...]}，gram 依 hash 分到 INDEX_SHARDS 個 shard
+    docs/search/docs/<n>.json   每 DOC_SHARD_SIZE 筆文件一個 shard
+    doc id 依 manga_list 的順序 (章節數多的在前)，搜尋結果也以此排序
+    """
+    index_dir = output_dir / "index"
+    docs_dir = output_dir / "docs"
+    for directory in (index_dir, docs_dir):
+        directory.mkdir(parents=True, exist_ok=True)
+        for old in directory.glob("*.json"):
+            old.unlink()
+            drop_compressed(old)
+
+    postings = [defaultdict(list) for _ in range(INDEX_SHARDS)]
+    for doc_id, manga in enumerate(manga_list):
+        grams = set()
+        for field in [manga["title"], manga["name"]] + list(manga["genres"]):
+            grams |= bigrams(normalize_text(field))
+        for gram in grams:
+            postings[gram_shard(gram)][gram].append(doc_id)
+
+    for k, shard in enumerate(postings):
+        write_json(index_dir / f"{k}.json", shard)
+
+    doc_shards = 0
+    for start in range(0, len(manga_list), DOC_SHARD_SIZE):
+        write_json(docs_dir / f"{doc_shards}.json",
+                   [doc_row(m) for m in manga_list[start:start + DOC_SHARD_SIZE]])
+        doc_shards += 1
+
+    write_json(output_dir / "meta.json", {
+        "docs": len(manga_list),
+        "index_shards": INDEX_SHARDS,
+        "doc_shard_size": DOC_SHARD_SIZE,
+    })
+    return output_dir
@@ -0,0 +1,90 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+class ShortTitleManifest:
+    """
+    json_fill_short 的工作清單：每個 JSON 文件的 mtime / size、title 與 short_title
+
+    scan() 只重新讀取 mtime 或大小有變動的文件，其餘只需要 stat；
+    pending() 直接由 manifest 取得還沒有 short_title 的文件，不必再讀取整個目錄
+    """
+
+    def __init__(self, path="short_title_manifest.db"):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                short_title TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_pending ON files (short_title, path)")
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def scan(self, dirs):
+        """
+        Returns:
+            (files, read, known) 文件總數、重新讀取的文件數、本次讀到已有 short_title 的 [(title, short)]
+        """
+        with self.lock:
+            stored = {path: (mtime_ns, size) for path, mtime_ns, size
+                      in self.conn.execute("SELECT path, mtime_ns, size FROM files")}
+        seen = set()
+        rows = []
+        known = []
+        for directory in map(os.path.normpath, map(str, dirs)):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json") or not entry.is_file():
+                        continue
+                    path = os.path.join(directory, entry.name)
+                    stat = entry.stat()
+                    seen.add(path)
+                    if stored.get(path) == (stat.st_mtime_ns, stat.st_size):
+                        continue
+                    try:
+                        with open(path, "r", encoding="utf-8") as f:
+                            data = json.load(f)
+                    except json.JSONDecodeError:
+                        print(f"Error reading {path}")
+                        continue
+                    short = data.get("short_title") or ""
+                    rows.append((path, stat.st_mtime_ns, stat.st_size, data["title"], short))
+                    if short:
+                        known.append((data["title"], short))
+
+        # 只清除本次掃描目錄中已刪除的文件
+        prefixes = tuple(os.path.join(os.path.normpath(str(directory)), "") for directory in dirs)
+        removed = [(path,) for path in stored.keys() - seen if path.startswith(prefixes)]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.executemany("DELETE FROM files WHERE path = ?", removed)
+        return len(seen), len(rows), known
+
+    def pending(self, dirs=None):
+        """還沒有 short_title 的 [(path, title)]，依路徑排序"""
+        with self.lock:
+            rows = self.conn.execute("SELECT path, title FROM files WHERE short_title = '' ORDER BY path").fetchall()
+        if dirs is None:
+            return rows
+        prefixes = tuple(os.path.join(os.path.normpath(str(directory)), "") for directory in dirs)
+        return [row for row in rows if row[0].startswith(prefixes)]
+
+    def mark_done(self, path, short):
+        """文件寫入 short_title 後更新，下次 scan() 不需要再讀取它"""
+        stat = os.stat(path)
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE files SET short_title = ?, mtime_ns = ?, size = ? WHERE path = ?",
+                              (short, stat.st_mtime_ns, stat.st_size, os.path.normpath(str(path))))
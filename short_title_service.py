@@ -0,0 +1,371 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+import difflib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+def normalize_title(title):
+    """快取 key：NFKC、去除前後空白、連續空白縮成一個、不分大小寫"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", title)).strip().casefold()
+
+def estimate_tokens(titles):
+    """粗估一個批次的 token 數 (日文約一字一 token，加上提示與輸出)"""
+    return 200 + sum(len(title) + 30 for title in titles)
+
+def match_results(titles, results, cutoff=0.8, margin=0.05):
+    """
+    依 title 把模型回傳的 {"title", "short"} 對應回輸入標題 (順序、缺漏都不影響)：
+    先比對原字串，再比對正規化標題，最後以 difflib 相似度對應剩餘結果。
+    相似度對應以全部 (標題, 結果) 配對由高到低分配，次佳配對與最佳相差不到 margin 時
+    (例如同系列的 1 / 2 集) 視為無法判斷，該標題重新排入佇列
+
+    Returns:
+        ({title: short}, [沒有對應結果的 title])
+    """
+    by_title = {}
+    by_key = {}
+    for index, result in enumerate(results):
+        by_title.setdefault(result["title"], index)
+        by_key.setdefault(normalize_title(result["title"]), index)
+
+    matched = {}
+    used = set()
+    unmatched = []
+    for title in titles:
+        index = by_title.get(title)
+        if index is None or index in used:
+            index = by_key.get(normalize_title(title))
+        if index is None or index in used:
+            unmatched.append(title)
+            continue
+        used.add(index)
+        matched[title] = results[index]["short"]
+
+    # 模型改寫了標題 (全形/半形、標點、截斷等) 時以相似度對應
+    remaining = {i: normalize_title(results[i]["title"]) for i in range(len(results)) if i not in used}
+    scores = {}
+    for title in unmatched:
+        key = normalize_title(title)
+        for i, result_key in remaining.items():
+            matcher = difflib.SequenceMatcher(None, key, result_key)
+            # 低於 cutoff - margin 的配對不可能被採用，也不會讓其他配對變得無法判斷
+            if matcher.real_quick_ratio() >= cutoff - margin and matcher.quick_ratio() >= cutoff - margin:
+                ratio = matcher.ratio()
+                if ratio >= cutoff - margin:
+                    scores[title, i] = ratio
+
+    done_titles = set()
+    done_results = set()
+    for (title, i), ratio in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+        if ratio < cutoff:
+            break
+        if title in done_titles or i in done_results:
+            continue
+        runner_up = max((r for (t, j), r in scores.items()
+                         if (t, j) != (title, i) and (t == title or j == i)
+                         and t not in done_titles and j not in done_results), default=0.0)
+        done_titles.add(title)
+        done_results.add(i)
+        if ratio - runner_up >= margin:
+            matched[title] = results[i]["short"]
+    missing = [title for title in unmatched if title not in matched]
+    return matched, missing
+
+# ---- 本地規則：能高信心縮短的標題不送給模型 ----
+
+JAPANESE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff\uff66-\uff9f]")
+MAX_JAPANESE_CHARS = 7
+MAX_ENGLISH_WORDS = 3
+
+# 【特装版】 (単話版) ［分冊版］ 等附註
+BRACKETS = re.compile(r"[【\[［(（〈《][^】\]］)）〉》]*[】\]］)）〉》]")
+# 副標題分隔：～ 〜 ~ － ― — – ：，以及前後有空白的 - 與後面有空白的 : (Re:ゼロ 之類不拆)
+SUBTITLE = re.compile(r"\s*(?:[～〜~－―—–：]|\s-\s|:(?=\s))")
+
+def fits_rule(title):
+    """符合「7 個字以下的日文或 3 個 words 以下的英文」"""
+    if not title:
+        return False
+    if JAPANESE.search(title):
+        return len(re.sub(r"\s", "", title)) <= MAX_JAPANESE_CHARS
+    return len(title.split()) <= MAX_ENGLISH_WORDS
+
+def local_short_title(title):
+    """
+    本地縮短：標題本身已符合規則，或去掉附註、副標題後符合規則時回傳結果，
+    否則回傳 None 交給模型
+    """
+    title = unicodedata.normalize("NFC", title).strip()
+    if fits_rule(title):
+        return title
+    main = BRACKETS.sub("", title).strip()
+    if fits_rule(main):
+        return main
+    # 只取第一個分隔符號前的主標題 (開頭就是分隔符號時無法判斷，交給模型)
+    head = SUBTITLE.split(main, maxsplit=1)[0].strip()
+    if len(head) >= 2 and head != main and fits_rule(head):
+        return head
+    return None
+
+@dataclass
+class ModelResponse:
+    """模型客戶端的回傳：results 為 {"title", "short"} (順序不限，以 match_results 依 title 對應)"""
+    results: list
+    truncated: bool = False
+    tokens: int = 0
+
+class ShortTitleCache:
+    """以正規化標題為 key 的 short title 快取 (SQLite)，跨目錄、跨執行共用"""
+
+    def __init__(self, path="short_title_cache.db"):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS short_title (
+                key TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                short TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    def get_many(self, titles):
+        """{title: short}，只包含有快取的標題"""
+        found = {}
+        keys = {normalize_title(title): title for title in titles}
+        items = list(keys.items())
+        with self.lock:
+            for start in range(0, len(items), 500):
+                chunk = dict(items[start:start + 500])
+                rows = self.conn.execute(
+                    f"SELECT key, short FROM short_title WHERE key IN ({', '.join('?' * len(chunk))})", list(chunk))
+                for key, short in rows:
+                    found[chunk[key]] = short
+        return found
+
+    def put_many(self, pairs):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO short_title VALUES (?, ?, ?, ?)",
+                                  [(normalize_title(title), title, short, now) for title, short in pairs])
+
+class RateBudget:
+    """
+    requests-per-minute 與 tokens-per-minute 的滑動視窗 (60 秒)，
+    acquire() 會等到兩者都有餘額才返回
+    """
+
+    def __init__(self, rpm=15, tpm=1_000_000, window=60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self.events = deque()  # (timestamp, tokens)
+        self.condition = threading.Condition()
+
+    def _expire(self, now):
+        while self.events and now - self.events[0][0] >= self.window:
+            self.events.popleft()
+
+    def acquire(self, tokens):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                used = sum(t for _, t in self.events)
+                # 單一請求超過 tpm 時只要視窗是空的就放行，避免永遠等待
+                if len(self.events) < self.rpm and (used + tokens <= self.tpm or not self.events):
+                    self.events.append([now, tokens])
+                    return self.events[-1]
+                self.condition.wait(timeout=self.events[0][0] + self.window - now)
+
+    def settle(self, event, tokens):
+        """以實際用量取代預估值"""
+        with self.condition:
+            event[1] = tokens
+            self.condition.notify_all()
+
+class AdaptiveBatchSize:
+    """
+    依回應延遲與截斷調整批次大小：
+    截斷 (輸出不完整) 時減半，延遲超過 target 時減少 1/4，順利且夠快時每次加 5
+    """
+
+    def __init__(self, initial=50, minimum=5, maximum=100, target_latency=20.0):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            return self.size
+
+    def update(self, latency, truncated):
+        with self.lock:
+            if truncated:
+                self.size = max(self.minimum, self.size // 2)
+            elif latency > self.target_latency:
+                self.size = max(self.minimum, int(self.size * 0.75))
+            else:
+                self.size = min(self.maximum, self.size + 5)
+            return self.size
+
+@dataclass
+class ServiceStats:
+    cached: int = 0
+    local: int = 0
+    generated: int = 0
+    failed: int = 0
+    requests: int = 0
+    truncated: int = 0
+    batch_sizes: list = field(default_factory=list)
+
+class ShortTitleService:
+    """
+    同時送出多個批次產生 short title，受 RateBudget 限制，
+    結果寫入 ShortTitleCache，同一個標題 (正規化後) 不會送出第二次
+
+    client 需提供 generate(titles) -> ModelResponse，可替換成本地的假客戶端
+    """
+
+    def __init__(self, client, cache, concurrency=4, rpm=15, tpm=1_000_000, batch_size=50, max_attempts=3,
+                 local_rules=True):
+        self.client = client
+        self.cache = cache
+        self.local_rules = local_rules
+        self.initial_batch_size = batch_size
+        self.concurrency = concurrency
+        self.budget = RateBudget(rpm, tpm)
+        self.batch_size = AdaptiveBatchSize(initial=batch_size)
+        self.max_attempts = max_attempts
+        self.stats = ServiceStats()
+
+    def shorten(self, titles, on_result=None):
+        """
+        Returns:
+            {title: short}；on_result(title, short) 在每個結果產生時呼叫 (包含快取命中)
+        """
+        unique = {}
+        for title in titles:
+            unique.setdefault(normalize_title(title), title)
+
+        results = self.cache.get_many(unique.values())
+        self.stats.cached += len(results)
+        if on_result:
+            for title, short in results.items():
+                on_result(title, short)
+
+        # 快取之後先用本地規則，剩下的才送給模型
+        if self.local_rules:
+            local = [(title, local_short_title(title)) for title in unique.values() if title not in results]
+            local = [(title, short) for title, short in local if short]
+            if local:
+                self.cache.put_many(local)
+                results.update(local)
+                self.stats.local += len(local)
+                if on_result:
+                    for title, short in local:
+                        on_result(title, short)
+
+        pending = deque((title, 0) for title in unique.values() if title not in results)
+        lock = threading.Lock()
+        changed = threading.Condition(lock)
+        in_flight = [0]
+
+        def take_batch():
+            with changed:
+                # 其他批次失敗時標題會重新排入 pending，還有批次在執行就先等待
+                while not pending and in_flight[0]:
+                    changed.wait()
+                size = self.batch_size.take()
+                batch = [pending.popleft() for _ in range(min(size, len(pending)))]
+                in_flight[0] += bool(batch)
+                return batch
+
+        def worker():
+            while batch := take_batch():
+                try:
+                    self.run_batch(batch, pending, lock, results, on_result)
+                finally:
+                    with changed:
+                        in_flight[0] -= 1
+                        changed.notify_all()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for future in [pool.submit(worker) for _ in range(self.concurrency)]:
+                future.result()
+        return results
+
+    def run_batch(self, batch, pending, lock, results, on_result):
+        titles = [title for title, _ in batch]
+        event = self.budget.acquire(estimate_tokens(titles))
+        start = time.perf_counter()
+        try:
+            response = self.client.generate(titles)
+        except Exception as e:
+            logger.warning(f"Short title request failed ({len(titles)} titles): {e}")
+            response = ModelResponse([], truncated=True)
+        latency = time.perf_counter() - start
+        self.budget.settle(event, response.tokens or estimate_tokens(titles))
+
+        # 依 title 對應：對到的立即寫入，只有缺少的標題重新排入 pending
+        matched, missing = match_results(titles, response.results)
+        # 少數遺漏只重排該標題；輸出被截斷或完全沒有結果才縮小批次
+        truncated = response.truncated or not matched
+        size = self.batch_size.update(latency, truncated)
+        pairs = list(matched.items())
+        if pairs:
+            self.cache.put_many(pairs)
+        with lock:
+            self.stats.requests += 1
+            self.stats.batch_sizes.append(len(titles))
+            self.stats.generated += len(pairs)
+            self.stats.truncated += truncated
+            results.update(pairs)
+            attempts_by_title = dict(batch)
+            for title in missing:
+                attempts = attempts_by_title[title] + 1
+                if attempts < self.max_attempts:
+                    pending.append((title, attempts))
+                else:
+                    self.stats.failed += 1
+                    logger.warning(f"Giving up on {title} after {self.max_attempts} attempts")
+        if on_result:
+            for title, short in pairs:
+                on_result(title, short)
+        logger.info(f"Batch of {len(titles)}: {len(pairs)} matched, {len(missing)} requeued "
+                    f"in {latency:.1f}s, next batch size {size}")
+
+    def saved_requests(self):
+        """本地規則省下的模型請求數 (以初始批次大小估算)"""
+        return -(-self.stats.local // self.initial_batch_size)
+
+class FakeModelClient:
+    """不呼叫 API 的本地客戶端：取標題前 7 個字，供離線測試 ShortTitleService"""
+
+    def __init__(self, latency=0.0, max_titles=None, drop_every=0):
+        self.latency = latency
+        self.max_titles = max_titles  # 超過時模擬輸出被截斷
+        self.drop_every = drop_every  # 每 n 筆漏掉一筆並反轉順序，模擬模型遺漏、重排
+
+    def generate(self, titles):
+        time.sleep(self.latency)
+        results = [{"title": t, "short": t[:7]} for t in titles]
+        if self.drop_every:
+            results = [r for i, r in enumerate(results) if (i + 1) % self.drop_every][::-1]
+        if self.max_titles is not None and len(titles) > self.max_titles:
+            return ModelResponse(results[:self.max_titles], truncated=True)
+        return ModelResponse(results, tokens=estimate_tokens(titles))
@@ -0,0 +1,17 @@
+from short_title_service import match_results
+
+def test_exact_and_normalized_titles():
+    results = [{"title": "ＡＢＣ", "short": "A"}, {"title": "進撃の巨人", "short": "進撃"}]
+    assert match_results(["進撃の巨人", "ABC"], results) == ({"進撃の巨人": "進撃", "ABC": "A"}, [])
+
+def test_fuzzy_match_prefers_closest_sequel():
+    titles = ["魔法少女まどか☆マギカ 1", "魔法少女まどか☆マギカ 2"]
+    results = [{"title": "魔法少女まどか★マギカ 2", "short": "まどマギ 2"}]
+    matched, missing = match_results(titles, results)
+    assert matched == {"魔法少女まどか☆マギカ 2": "まどマギ 2"}
+    assert missing == ["魔法少女まどか☆マギカ 1"]
+
+def test_ambiguous_fuzzy_match_is_requeued():
+    titles = ["魔法少女まどか☆マギカ 1", "魔法少女まどか☆マギカ 2"]
+    results = [{"title": "魔法少女まどか★マギカ 3", "short": "まどマギ 3"}]
+    assert match_results(titles, results) == ({}, titles)
@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import requests
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 原始縮圖寬 300px
+WIDTHS = (150, 300)
+
+def avif_supported():
+    """Pillow 11.2+ 內建 AVIF，較舊版本需要 pillow-avif-plugin"""
+    try:
+        import pillow_avif  # noqa: F401  註冊 AVIF plugin
+    except ImportError:
+        pass
+    Image.init()
+    return "AVIF" in Image.SAVE
+
+def write_atomic(path, write):
+    """
+    寫入同目錄的暫存檔後再 os.replace，中斷時不會留下不完整的檔案被 exists() 當成已完成，
+    同時處理同一張圖時也不會交錯寫入同一個檔案
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+class ThumbnailStore:
+    """
+    漫畫封面的本地鏡像
+
+    原圖以內容 sha256 存放在 cache_dir/orig/ (不發佈)，
+    cache_dir/index.json 記錄 URL -> sha256，已下載的 URL 不會再抓取；
+    縮小後的 WebP (以及支援時的 AVIF) 輸出到 docs/thumbs/<hash>-<width>.<ext>
+    """
+
+    def __init__(self, cache_dir=".thumb_cache", output_dir=Path("docs") / "thumbs", widths=WIDTHS, workers=8):
+        self.cache_dir = Path(cache_dir)
+        self.orig_dir = self.cache_dir / "orig"
+        self.output_dir = Path(output_dir)
+        self.orig_dir.mkdir(parents=True, exist_ok=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.widths = widths
+        self.workers = workers
+        self.formats = ["webp"] + (["avif"] if avif_supported() else [])
+        self.index_path = self.cache_dir / "index.json"
+        self.index = json.loads(self.index_path.read_text(encoding="utf-8")) if self.index_path.exists() else {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def orig_path(self, digest):
+        return self.orig_dir / digest[:2] / digest
+
+    def fetch(self, url):
+        """Download `url` once and return the sha256 of its content."""
+        with self.lock:
+            digest = self.index.get(url)
+        if digest and self.orig_path(digest).exists():
+            return digest
+
+        response = self.session().get(url, timeout=30)
+        response.raise_for_status()
+        data = response.content
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.orig_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            write_atomic(path, lambda f: f.write(data))
+        with self.lock:
+            self.index[url] = digest
+        return digest
+
+    def variant_path(self, digest, width, fmt):
+        return self.output_dir / f"{digest[:16]}-{width}.{fmt}"
+
+    def make_variants(self, digest):
+        """Create missing variants and return {format: srcset} with paths relative to docs/."""
+        image = None
+        srcsets = {}
+        for fmt in self.formats:
+            entries = []
+            for width in self.widths:
+                path = self.variant_path(digest, width, fmt)
+                if not path.exists():
+                    if image is None:
+                        image = Image.open(io.BytesIO(self.orig_path(digest).read_bytes()))
+                        image.load()
+                        if image.mode not in ("RGB", "RGBA"):
+                            image = image.convert("RGB")
+                    # thumbnail() 不會放大，比原圖寬的版本維持原尺寸
+                    resized = image.copy()
+                    resized.thumbnail((width, width * 10))
+                    write_atomic(path, lambda f: resized.save(f, fmt.upper(), quality=75))
+                entries.append(f"{self.output_dir.name}/{path.name} {width}w")
+            srcsets[fmt] = ", ".join(entries)
+        return srcsets
+
+    def process(self, url):
+        try:
+            return url, self.make_variants(self.fetch(url))
+        except Exception as e:
+            logger.warning(f"Thumbnail failed for {url}: {e}")
+            return url, None
+
+    def sync(self, urls):
+        """
+        下載並轉換所有封面，已存在的原圖與縮圖會略過
+
+        Returns:
+            {image url: {"webp": srcset, "avif": srcset}}
+        """
+        urls = sorted({url for url in urls if url})
+        thumbs = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for url, srcsets in pool.map(self.process, urls):
+                if srcsets:
+                    thumbs[url] = srcsets
+        index = json.dumps(self.index, ensure_ascii=False).encode("utf-8")
+        write_atomic(self.index_path, lambda f: f.write(index))
+        print(f"Thumbnails ready: {len(thumbs)}/{len(urls)}")
+        return thumbs